@@ -1,36 +1,18 @@
-import click
+import sys
+import typing as typ
 
+import taggu.cli as tc
 
-class ArgNames:
-    LIBRARY_ROOT_DIR = 'library-root-dir'
-    FILE_FN = 'file-fn'
-    SELF_FN = 'self-fn'
 
+def main(argv: typ.Optional[typ.Sequence[str]]=None) -> None:
+    parser = tc.Cli.get_arg_parser()
+    args = parser.parse_args(argv)
 
-@click.group()
-@click.argument(f'{ArgNames.LIBRARY_ROOT_DIR}', type=click.Path(exists=True, file_okay=False, dir_okay=True, resolve_path=True))
-@click.option(f'--{ArgNames.FILE_FN}', default='taggu_file.yml')
-@click.option(f'--{ArgNames.SELF_FN}', default='taggu_self.yml')
-@click.pass_context
-def cli(ctx, library_root_dir, file_fn, self_fn):
-    ctx.obj[ArgNames.LIBRARY_ROOT_DIR] = library_root_dir
-    ctx.obj[ArgNames.FILE_FN] = file_fn
-    ctx.obj[ArgNames.SELF_FN] = self_fn
+    subcommand = tc.SUBCOMMANDS[getattr(args, tc.ArgNames.SUBCOMMAND)]
+    subcommand(library_root_dir=getattr(args, tc.ArgNames.LIBRARY_ROOT_DIR),
+               file_fn=getattr(args, tc.ArgNames.FILE_FN),
+               self_fn=getattr(args, tc.ArgNames.SELF_FN))
 
 
-@cli.command()
-@click.pass_context
-def interactive(ctx):
-    click.echo('Interactive mode!')
-    click.echo(f'Library Root Dir: {ctx.obj[ArgNames.LIBRARY_ROOT_DIR]}, '
-               f'File FN: {ctx.obj[ArgNames.FILE_FN]}, '
-               f'Self FN: {ctx.obj[ArgNames.SELF_FN]}')
-
-
-@cli.command()
-@click.pass_context
-def query(ctx):
-    click.echo('Query mode!')
-    click.echo(f'Library Root Dir: {ctx.obj[ArgNames.LIBRARY_ROOT_DIR]}, '
-               f'File FN: {ctx.obj[ArgNames.FILE_FN]}, '
-               f'Self FN: {ctx.obj[ArgNames.SELF_FN]}')
+if __name__ == '__main__':
+    main(sys.argv[1:])
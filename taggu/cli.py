@@ -2,15 +2,22 @@ import argparse
 import pathlib
 
 
+class ArgNames:
+    LIBRARY_ROOT_DIR = 'library_root_dir'
+    FILE_FN = 'file_fn'
+    SELF_FN = 'self_fn'
+    SUBCOMMAND = 'subcommand'
+
+
 class Cli:
     @staticmethod
     def as_directory(path_str: str) -> pathlib.Path:
         path = pathlib.Path(path_str)
 
-        if not path.exists() or path.is_dir():
+        if not path.is_dir():
             raise argparse.ArgumentTypeError(f'{path} does not exist or is not a directory')
 
-        return path
+        return path.resolve()
 
     @staticmethod
     def get_arg_parser() -> argparse.ArgumentParser:
@@ -18,12 +25,24 @@ class Cli:
 
         common = argparse.ArgumentParser(add_help=False)
         common.add_argument(
-                'library_root_dir',
-                type=pathlib.Path,
+                ArgNames.LIBRARY_ROOT_DIR,
+                type=Cli.as_directory,
                 help='root directory of music library',
         )
+        common.add_argument(
+                '--file-fn',
+                dest=ArgNames.FILE_FN,
+                default='taggu_file.yml',
+                help='file name of item meta files',
+        )
+        common.add_argument(
+                '--self-fn',
+                dest=ArgNames.SELF_FN,
+                default='taggu_self.yml',
+                help='file name of self meta files',
+        )
 
-        subparsers = parser.add_subparsers(dest='subcommand')
+        subparsers = parser.add_subparsers(dest=ArgNames.SUBCOMMAND)
         # As seen on http://stackoverflow.com/questions/18282403/argparse-with-required-subcommands
         subparsers.required = True
 
@@ -31,3 +50,23 @@ class Cli:
         subparser_query = subparsers.add_parser('query', parents=[common])
 
         return parser
+
+
+def interactive(*, library_root_dir: pathlib.Path, file_fn: str, self_fn: str) -> None:
+    print('Interactive mode!')
+    print(f'Library Root Dir: {library_root_dir}, '
+          f'File FN: {file_fn}, '
+          f'Self FN: {self_fn}')
+
+
+def query(*, library_root_dir: pathlib.Path, file_fn: str, self_fn: str) -> None:
+    print('Query mode!')
+    print(f'Library Root Dir: {library_root_dir}, '
+          f'File FN: {file_fn}, '
+          f'Self FN: {self_fn}')
+
+
+SUBCOMMANDS = {
+    'interactive': interactive,
+    'query': query,
+}
@@ -1,10 +1,13 @@
-import abc
+import functools as ft
+import itertools as it
+import os
 import pathlib as pl
 import typing as typ
 
 import taggu.contexts.library as tlib
 import taggu.helpers as th
 import taggu.logging as tl
+import taggu.persist as tp
 import taggu.types as tt
 
 logger = tl.get_logger(__name__)
@@ -15,106 +18,150 @@ logger = tl.get_logger(__name__)
 ########################################################################################################################
 
 
-class DiscoveryContext(abc.ABC):
+def meta_file_exists(rel_meta_path: pl.Path, abs_meta_path: pl.Path, rel_item_path: pl.Path) -> bool:
+    if os.path.isfile(abs_meta_path):
+        logger.debug('Found meta file "%s" for item "%s"', rel_meta_path, rel_item_path)
+        return True
+
+    logger.debug('Meta file "%s" does not exist for item "%s"', rel_meta_path, rel_item_path)
+    return False
+
+
+class DiscoveryContext:
     """Handles retrieving meta file and item paths, along with raw metadata retrieval."""
+    __slots__ = ('library_context', 'persisted', 'self_meta_file_name', 'item_meta_file_name',
+                 'candidate_meta_files_from_item_cached')
+
+    def __init__(self, library_context: tlib.LibraryContext, persist_meta_files: bool=False):
+        self.library_context = library_context
+
+        # If persisting, parsed meta files are loaded from a previous run, and saved back on close or interpreter exit.
+        # Discovery contexts on the same root directory share the same persisted meta files.
+        self.persisted: typ.Optional[tp.PersistedMetaFiles] = None
+        if persist_meta_files:
+            self.persisted = tp.open_cache(root_dir=library_context.get_root_dir())
+
+        self.self_meta_file_name = pl.Path(library_context.get_self_meta_file_name())
+        self.item_meta_file_name = pl.Path(library_context.get_item_meta_file_name())
 
-    @classmethod
-    @abc.abstractmethod
-    def get_library_context(cls) -> tlib.LibraryContext:
+        # Candidate meta file paths only depend on the item path, so they can be cached indefinitely.
+        self.candidate_meta_files_from_item_cached = ft.lru_cache(maxsize=4096)(
+            self.candidate_meta_files_from_item_uncached)
+
+    def get_library_context(self) -> tlib.LibraryContext:
         """Returns the library context used in this discovery context."""
-        pass
+        return self.library_context
+
+    def save(self):
+        """Saves the persisted meta files now, instead of waiting for interpreter exit, if persisting."""
+        if self.persisted is not None:
+            tp.save_open_cache(root_dir=self.library_context.get_root_dir())
+
+    def close(self):
+        """Saves and releases the persisted meta files. Meta files read after this are no longer persisted."""
+        if self.persisted is not None:
+            tp.close_cache(root_dir=self.library_context.get_root_dir())
+            self.persisted = None
+
+    def read_meta_file(self, abs_meta_path: pl.Path) -> typ.Any:
+        persisted = self.persisted
+        if persisted is None:
+            # Top level sequences in item meta files are parsed lazily, one block at a time, as they are multiplexed.
+            # Self meta files only provide metadata as a mapping, so they are always parsed as a whole.
+            if abs_meta_path.name == self.item_meta_file_name.name:
+                return th.read_yaml_file_streaming(abs_meta_path)
+            return th.read_yaml_file(abs_meta_path)
+
+        # A persisted meta file is only reused if it has not been modified since it was parsed.
+        # Entries written by older versions have a different shape, and are never matched.
+        key = str(abs_meta_path)
+        st = os.stat(abs_meta_path)
+        entry = persisted.get(key)
+        if entry is not None and len(entry) == 3 and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            logger.debug('Using persisted contents of meta file "%s"', abs_meta_path)
+            return entry[2]
+
+        yaml_data = th.read_yaml_file(abs_meta_path)
+        persisted[key] = (st.st_mtime_ns, st.st_size, yaml_data)
+        return yaml_data
+
+    def candidate_meta_files_from_item(self, rel_item_path: pl.Path) -> typ.Sequence[tt.PathPair]:
+        """Given an item path, returns the relative and absolute paths of all meta files that could provide direct
+        metadata for that item, in order of priority. Whether these meta files exist is not checked.
+        """
+        return self.candidate_meta_files_from_item_cached(rel_item_path)
+
+    def candidate_meta_files_from_item_uncached(self, rel_item_path: pl.Path) -> typ.Sequence[tt.PathPair]:
+        # The self and item meta sources of the library context are inlined here, in order of priority.
+        rel_item_path, abs_item_path = self.library_context.co_norm(rel_sub_path=rel_item_path)
+
+        # Self meta files are contained in the item itself, if it is a directory.
+        # A separate directory check is not needed, since a path under a non-directory is never a file.
+        self_meta_file_name = self.self_meta_file_name
+        candidates = [(rel_item_path / self_meta_file_name, abs_item_path / self_meta_file_name)]
+
+        # Item meta files are contained in the parent directory of the item, if not at the root.
+        rel_parent_dir = rel_item_path.parent
+        if rel_parent_dir != rel_item_path:
+            item_meta_file_name = self.item_meta_file_name
+            candidates.append((rel_parent_dir / item_meta_file_name, abs_item_path.parent / item_meta_file_name))
+
+        return tuple(candidates)
 
-    @classmethod
-    @abc.abstractmethod
-    def meta_files_from_item(cls, rel_item_path: pl.Path) -> tt.PathGen:
+    def meta_files_from_item(self, rel_item_path: pl.Path) -> tt.PathGen:
         """Given an item path, yields all valid meta file paths that could provide direct metadata for that item.
         This also verifies that all of the resulting meta file paths exist.
         """
-        pass
-
-    @classmethod
-    @abc.abstractmethod
-    def items_from_meta_file(cls, rel_meta_path: pl.Path) -> tt.PathMetadataPairGen:
+        logger.debug('Looking up meta files for item "%s"', rel_item_path)
+        for rel_meta_path, abs_meta_path in self.candidate_meta_files_from_item(rel_item_path):
+            if meta_file_exists(rel_meta_path, abs_meta_path, rel_item_path):
+                yield rel_meta_path
+
+    def items_from_meta_file(self, rel_meta_path: pl.Path,
+                             read_meta_file: typ.Optional[typ.Callable[[pl.Path], typ.Any]]=None
+                             ) -> tt.PathMetadataPairGen:
         """Given a meta file path, yields all item paths that this meta file provides metadata for, along with the
         metadata itself.
+        If the meta file has already been read elsewhere, a function returning its data can be passed in as
+        read_meta_file, which is called with the absolute meta file path instead of reading the meta file.
         """
-        pass
-
-    @classmethod
-    def meta_files_from_items(cls, rel_item_paths: typ.Iterable[pl.Path]) -> tt.PathGen:
-        for rel_item_path in rel_item_paths:
-            yield from cls.meta_files_from_item(rel_item_path=rel_item_path)
-
-    @classmethod
-    def items_from_meta_files(cls, rel_meta_paths: typ.Iterable[pl.Path]) -> tt.PathMetadataPairGen:
-        for rel_meta_path in rel_meta_paths:
-            yield from cls.items_from_meta_file(rel_meta_path=rel_meta_path)
-
-
-def gen_discovery_ctx(*, library_context: tlib.LibraryContext) -> DiscoveryContext:
-    class DC(DiscoveryContext):
-        @classmethod
-        def get_library_context(cls) -> tlib.LibraryContext:
-            return library_context
-
-        @classmethod
-        def meta_files_from_item(cls, rel_item_path: pl.Path) -> tt.PathGen:
-            logger.info(f'Looking up meta files for item "{rel_item_path}"')
-            meta_specs: tt.MetaSourceSpecGen = library_context.yield_meta_source_specs()
-            for meta_spec in meta_specs:
-                meta_file_name: pl.Path = meta_spec.meta_file_name
-                dir_getter: tt.DirGetter = meta_spec.dir_getter
-
-                # This loop will normally execute either zero or one time.
-                for rel_meta_dir in dir_getter(rel_item_path):
-                    rel_meta_dir, abs_meta_dir = library_context.co_norm(rel_sub_path=rel_meta_dir)
-
-                    rel_meta_path = rel_meta_dir / meta_file_name
-                    abs_meta_path = abs_meta_dir / meta_file_name
-
-                    if abs_meta_path.is_file():
-                        logger.info(f'Found meta file "{rel_meta_path}" for item "{rel_item_path}"')
-                        yield rel_meta_path
-                    else:
-                        logger.debug(f'Meta file "{rel_meta_path}" does not exist for item "{rel_item_path}"')
-
-        @classmethod
-        def items_from_meta_file(cls, rel_meta_path: pl.Path) -> tt.PathMetadataPairGen:
-            """Given a meta file path, yields all item paths that this meta file provides metadata for, along with the
-            metadata itself.
-            """
-            rel_meta_path, abs_meta_path = library_context.co_norm(rel_sub_path=rel_meta_path)
-
-            # Check that the provided path exists and is a file.
-            if not abs_meta_path.is_file():
-                msg = f'Meta file "{rel_meta_path}" does not exist, or is not a file'
-                logger.error(msg)
-                return
-
-            # Get the meta file name and containing dir path.
-            rel_containing_dir = rel_meta_path.parent
-            meta_file_name = pl.Path(rel_meta_path.name)
-
-            # Find the meta source matching this meta file name.
-            target_meta_spec: typ.Optional[tt.MetaSourceSpec] = None
-            meta_specs: tt.MetaSourceSpecGen = library_context.yield_meta_source_specs()
-            for meta_spec in meta_specs:
-                meta_fn: pl.Path = meta_spec.meta_file_name
-                if meta_file_name == meta_fn:
-                    target_meta_spec = meta_spec
-                    break
-
-            # If the target meta source is not set, then the file name did not match that of any of the meta sources.
-            if target_meta_spec is None:
-                msg = f'Unknown meta file name "{meta_file_name}"'
-                logger.error(msg)
-                return
-
-            # Open the meta file and read as YAML.
-            # TODO: Add checking and logging for exceptions in here.
-            yaml_data = th.read_yaml_file(abs_meta_path)
-
-            multiplexer: tt.Multiplexer = target_meta_spec.multiplexer
-            yield from multiplexer(yaml_data, rel_containing_dir)
-
-    return DC()
+        rel_meta_path, abs_meta_path = self.library_context.co_norm(rel_sub_path=rel_meta_path)
+
+        # Get the meta file name and containing dir path.
+        rel_containing_dir = rel_meta_path.parent
+        meta_file_name = rel_meta_path.name
+
+        # Find the meta source matching this meta file name.
+        target_meta_spec = self.library_context.get_meta_source_spec(meta_file_name=meta_file_name)
+
+        # If the target meta source is not set, then the file name did not match that of any of the meta sources.
+        if target_meta_spec is None:
+            msg = f'Unknown meta file name "{meta_file_name}"'
+            logger.error(msg)
+            return
+
+        # Open the meta file and read as YAML.
+        # Opening fails if the provided path does not exist or is not a file, so no separate check is needed beforehand.
+        # TODO: Add checking and logging for exceptions in here.
+        if read_meta_file is None:
+            read_meta_file = self.read_meta_file
+
+        try:
+            yaml_data = read_meta_file(abs_meta_path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            msg = f'Meta file "{rel_meta_path}" does not exist, or is not a file'
+            logger.error(msg)
+            return
+
+        multiplexer: tt.Multiplexer = target_meta_spec.multiplexer
+        yield from multiplexer(yaml_data, rel_containing_dir)
+
+    def meta_files_from_items(self, rel_item_paths: typ.Iterable[pl.Path]) -> typ.Iterator[pl.Path]:
+        return it.chain.from_iterable(map(self.meta_files_from_item, rel_item_paths))
+
+    def items_from_meta_files(self, rel_meta_paths: typ.Iterable[pl.Path]) -> typ.Iterator[tt.PathMetadataPair]:
+        return it.chain.from_iterable(map(self.items_from_meta_file, rel_meta_paths))
+
+
+def gen_discovery_ctx(*, library_context: tlib.LibraryContext, persist_meta_files: bool=False) -> DiscoveryContext:
+    return DiscoveryContext(library_context=library_context, persist_meta_files=persist_meta_files)
@@ -1,4 +1,3 @@
-import abc
 import pathlib as pl
 import typing as typ
 import collections.abc
@@ -12,55 +11,35 @@ import taggu.types as tt
 logger = tl.get_logger(__name__)
 
 
-class ItemContext(abc.ABC):
+class ItemContext:
     """Handles retrieving and caching individual fields from metadata for a specific constant item."""
+    __slots__ = ('query_context', 'rel_item_path')
 
-    @classmethod
-    @abc.abstractmethod
-    def get_query_context(cls) -> tcq.QueryContext:
-        pass
+    def __init__(self, query_context: tcq.QueryContext, rel_item_path: pl.Path):
+        self.query_context = query_context
+        self.rel_item_path = rel_item_path
 
-    @classmethod
-    @abc.abstractmethod
-    def get_rel_item_path(cls) -> pl.Path:
-        pass
+    def get_query_context(self) -> tcq.QueryContext:
+        return self.query_context
 
-    @classmethod
-    def yield_field(cls, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
-                    mapping_iter_style=tcq.MappingIterStyle.KEYS) -> tcq.FieldValueGen:
-        query_ctx = cls.get_query_context()
-        rel_item_path = cls.get_rel_item_path()
+    def get_rel_item_path(self) -> pl.Path:
+        return self.rel_item_path
 
-        return query_ctx.yield_field(rel_item_path=rel_item_path, field_name=field_name, labels=labels,
-                                     mapping_iter_style=mapping_iter_style)
+    def yield_field(self, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
+                    mapping_iter_style=tcq.MappingIterStyle.KEYS) -> tcq.FieldValueGen:
+        return self.query_context.yield_field(rel_item_path=self.rel_item_path, field_name=field_name, labels=labels,
+                                              mapping_iter_style=mapping_iter_style)
 
-    @classmethod
-    def yield_parent_fields(cls, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
+    def yield_parent_fields(self, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
                             mapping_iter_style=tcq.MappingIterStyle.KEYS) -> tcq.FieldValueGen:
-        query_ctx = cls.get_query_context()
-        rel_item_path = cls.get_rel_item_path()
-
-        return query_ctx.yield_parent_fields(rel_item_path=rel_item_path, field_name=field_name, labels=labels,
-                                             mapping_iter_style=mapping_iter_style)
+        return self.query_context.yield_parent_fields(rel_item_path=self.rel_item_path, field_name=field_name,
+                                                      labels=labels, mapping_iter_style=mapping_iter_style)
 
-    @classmethod
-    def yield_child_fields(cls, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
+    def yield_child_fields(self, *, field_name: str, labels: typ.Optional[tcq.LabelContainer],
                            mapping_iter_style=tcq.MappingIterStyle.KEYS) -> tcq.FieldValueGen:
-        query_ctx = cls.get_query_context()
-        rel_item_path = cls.get_rel_item_path()
-
-        return query_ctx.yield_child_fields(rel_item_path=rel_item_path, field_name=field_name, labels=labels,
-                                            mapping_iter_style=mapping_iter_style)
+        return self.query_context.yield_child_fields(rel_item_path=self.rel_item_path, field_name=field_name,
+                                                     labels=labels, mapping_iter_style=mapping_iter_style)
 
 
 def gen_item_ctx(*, query_context: tcq.QueryContext, rel_item_path: pl.Path) -> ItemContext:
-    class IC(ItemContext):
-        @classmethod
-        def get_query_context(cls):
-            return query_context
-
-        @classmethod
-        def get_rel_item_path(cls):
-            return rel_item_path
-
-    return IC()
+    return ItemContext(query_context=query_context, rel_item_path=rel_item_path)
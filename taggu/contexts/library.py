@@ -1,8 +1,10 @@
 import typing as typ
+import bisect
 import os.path
+import sys
 import collections.abc
 import pathlib as pl
-import abc
+import functools as ft
 
 import taggu.logging as tl
 import taggu.exceptions as tex
@@ -12,159 +14,342 @@ import taggu.types as tt
 
 logger = tl.get_logger(__name__)
 
-########################################################################################################################
-#   Library context
-########################################################################################################################
+# A set of item names in a directory, along with the same names in sorted order.
+ItemNameScan = typ.Tuple[typ.AbstractSet[str], typ.Sequence[str]]
+
+
+class DirScan(typ.NamedTuple):
+    """The result of scanning a directory for eligible items."""
+    item_names: typ.AbstractSet[str]
+    sorted_item_names: typ.Sequence[str]
+    dir_item_names: typ.AbstractSet[str]
+
 
+# Identifies the state of a directory, for keying cached listings: its modification time, change time, link count, and
+# size. Two changes within one timestamp tick leave the times as they were, but usually still change one of the others.
+DirStamp = typ.Tuple[int, int, int, int]
 
-class LibraryContext(abc.ABC):
-    @classmethod
-    @abc.abstractmethod
-    def get_root_dir(cls) -> pl.Path:
-        pass
 
-    @classmethod
-    @abc.abstractmethod
-    def get_media_item_filter(cls) -> typ.Optional[tt.ItemFilter]:
-        pass
+def dir_stamp(st: os.stat_result) -> DirStamp:
+    """Returns the stamp used to key cached listings of a directory, given the stat result of that directory."""
+    return st.st_mtime_ns, st.st_ctime_ns, st.st_nlink, st.st_size
 
-    @classmethod
-    @abc.abstractmethod
-    def get_media_item_sort_key(cls) -> typ.Optional[tt.ItemSortKey]:
-        pass
 
-    @classmethod
-    @abc.abstractmethod
-    def get_item_meta_file_name(cls) -> str:
-        pass
+########################################################################################################################
+#   Library context
+########################################################################################################################
 
-    @classmethod
-    @abc.abstractmethod
-    def get_self_meta_file_name(cls) -> str:
-        pass
 
-    @classmethod
-    def co_norm(cls, *, rel_sub_path: pl.Path) -> typ.Tuple[pl.Path, pl.Path]:
+class LibraryContext:
+    """Handles the layout of a library on disk, and how metadata is applied to the items in it."""
+    __slots__ = ('root_dir', 'root_dir_prefix_str', 'media_item_filter', 'media_item_sort_key', 'self_meta_file_name',
+                 'item_meta_file_name', 'co_norm_cached', 'scan_dir_cached', 'sorted_item_paths_in_dir_cached',
+                 'dir_item_paths_in_dir_cached', 'meta_source_specs', 'meta_source_specs_by_name')
+
+    def __init__(self, root_dir: pl.Path, media_item_filter: typ.Optional[tt.ItemFilter],
+                 media_item_sort_key: typ.Optional[tt.ItemSortKey], self_meta_file_name: typ.Union[str, pl.Path],
+                 item_meta_file_name: typ.Union[str, pl.Path]):
+        self.root_dir = root_dir
+
+        # Normalized sub paths of the root directory start with this prefix, which co_norm checks for and strips.
+        root_dir_str = os.path.normpath(root_dir)
+        self.root_dir_prefix_str = root_dir_str if root_dir_str.endswith(os.sep) else root_dir_str + os.sep
+
+        self.media_item_filter = media_item_filter
+        self.media_item_sort_key = media_item_sort_key
+        self.self_meta_file_name = self_meta_file_name
+        self.item_meta_file_name = item_meta_file_name
+
+        # The root directory is fixed for this context, so normalization results can be reused.
+        # Failed normalizations raise, and are thus never cached.
+        self.co_norm_cached = ft.lru_cache(maxsize=4096)(self.co_norm_uncached)
+
+        # Adding or removing directory entries changes the stamp of the directory.
+        # Including it in the cache key ensures that stale scans are not reused.
+        @ft.lru_cache(maxsize=1024)
+        def scan_dir_cached(rel_sub_dir_path: pl.Path, dir_stamp: typ.Optional[DirStamp]) -> DirScan:
+            return self.scan_dir_uncached(rel_sub_dir_path=rel_sub_dir_path)
+
+        self.scan_dir_cached = scan_dir_cached
+
+        # Reusing the same path objects keeps their hashes and string forms from being recomputed by later lookups.
+        @ft.lru_cache(maxsize=1024)
+        def sorted_item_paths_in_dir_cached(rel_sub_dir_path: pl.Path,
+                                            dir_stamp: typ.Optional[DirStamp]) -> typ.Sequence[pl.Path]:
+            sorted_item_names = scan_dir_cached(rel_sub_dir_path, dir_stamp).sorted_item_names
+            return tuple(rel_sub_dir_path / item_name for item_name in sorted_item_names)
+
+        self.sorted_item_paths_in_dir_cached = sorted_item_paths_in_dir_cached
+
+        @ft.lru_cache(maxsize=1024)
+        def dir_item_paths_in_dir_cached(rel_sub_dir_path: pl.Path,
+                                         dir_stamp: typ.Optional[DirStamp]) -> typ.AbstractSet[pl.Path]:
+            dir_item_names = scan_dir_cached(rel_sub_dir_path, dir_stamp).dir_item_names
+            return frozenset(rel_item_path
+                             for rel_item_path in sorted_item_paths_in_dir_cached(rel_sub_dir_path, dir_stamp)
+                             if rel_item_path.name in dir_item_names)
+
+        self.dir_item_paths_in_dir_cached = dir_item_paths_in_dir_cached
+
+        # The meta source specifications only depend on fixed values of this context, so they are built once here.
+        # The order of these specifications designates their priority; earlier is higher priority in case of a conflict.
+        self.meta_source_specs: typ.Sequence[tt.MetaSourceSpec] = (
+            tt.MetaSourceSpec(meta_file_name=pl.Path(self_meta_file_name),
+                              dir_getter=self.yield_contains_dir,
+                              multiplexer=self.yield_self_meta_pairs),
+            tt.MetaSourceSpec(meta_file_name=pl.Path(item_meta_file_name),
+                              dir_getter=self.yield_siblings_dir,
+                              multiplexer=self.yield_item_meta_pairs),
+        )
+        # Meta files are matched to their meta source by plain file name, which avoids building a path per lookup.
+        self.meta_source_specs_by_name: typ.Mapping[str, tt.MetaSourceSpec] = {
+            str(meta_spec.meta_file_name): meta_spec for meta_spec in self.meta_source_specs
+        }
+
+    def get_root_dir(self) -> pl.Path:
+        return self.root_dir
+
+    def get_media_item_filter(self) -> typ.Optional[tt.ItemFilter]:
+        return self.media_item_filter
+
+    def get_media_item_sort_key(self) -> typ.Optional[tt.ItemSortKey]:
+        return self.media_item_sort_key
+
+    def get_item_meta_file_name(self) -> str:
+        return self.item_meta_file_name
+
+    def get_self_meta_file_name(self) -> str:
+        return self.self_meta_file_name
+
+    def clear_dir_caches(self):
+        """Drops all cached directory listings. Cached listings are keyed on the stamp of their directory (see
+        dir_stamp), so this is usually only needed to release the memory used by listings of unchanged directories.
+        On filesystems with coarse timestamps (such as FAT, HFS+, or some network filesystems), a change that lands in
+        the same timestamp tick as the previous one and keeps the link count and size of the directory, such as renaming
+        an entry, can go unnoticed. Calling this after making such changes ensures that they are picked up.
+        """
+        self.scan_dir_cached.cache_clear()
+        self.sorted_item_paths_in_dir_cached.cache_clear()
+        self.dir_item_paths_in_dir_cached.cache_clear()
+
+    def co_norm(self, *, rel_sub_path: pl.Path) -> typ.Tuple[pl.Path, pl.Path]:
         """Normalizes a relative sub path with respect to the enclosed root directory.
         Returns a tuple of the re-normalized relative sub path and the absolute sub path.
         """
+        return self.co_norm_cached(rel_sub_path=rel_sub_path)
+
+    def co_norm_uncached(self, *, rel_sub_path: pl.Path) -> typ.Tuple[pl.Path, pl.Path]:
         if rel_sub_path.is_absolute():
             msg = f'Sub path "{rel_sub_path}" is not a relative path'
             logger.error(msg)
             raise tex.AbsoluteSubpath(msg)
 
-        root_dir = cls.get_root_dir()
-        path = root_dir / rel_sub_path
-        abs_sub_path = pl.Path(os.path.normpath(path))
-        try:
-            rel_sub_path = abs_sub_path.relative_to(root_dir)
-        except ValueError:
-            msg = f'Normalized absolute path "{abs_sub_path}" is not a sub path of root directory "{root_dir}"'
+        # The path arithmetic is done on strings, which is much faster than the equivalent pathlib operations.
+        root_dir_prefix_str = self.root_dir_prefix_str
+        abs_sub_path_str = os.path.normpath(os.path.join(root_dir_prefix_str, rel_sub_path))
+        if abs_sub_path_str.startswith(root_dir_prefix_str):
+            rel_sub_path_str = abs_sub_path_str[len(root_dir_prefix_str):]
+        elif abs_sub_path_str == root_dir_prefix_str[:-1]:
+            # This is the root directory itself.
+            rel_sub_path_str = ''
+        else:
+            msg = (f'Normalized absolute path "{abs_sub_path_str}" is not a sub path of root directory '
+                   f'"{self.root_dir}"')
             logger.error(msg)
             raise tex.EscapingSubpath(msg)
-        return rel_sub_path, abs_sub_path
+        return pl.Path(rel_sub_path_str), pl.Path(abs_sub_path_str)
 
-    @classmethod
-    def yield_contains_dir(cls, rel_sub_path: pl.Path) -> tt.PathGen:
-        rel_sub_path, abs_sub_path = cls.co_norm(rel_sub_path=rel_sub_path)
+    def yield_contains_dir(self, rel_sub_path: pl.Path, abs_sub_path: pl.Path) -> tt.PathPairGen:
+        """Given a co-normalized relative and absolute sub path, yields the relative and absolute paths of the
+        directory containing the self meta file for that sub path, if any.
+        """
         if abs_sub_path.is_dir():
-            logger.debug(f'Yielding contains dir for sub path "{rel_sub_path}"')
-            yield rel_sub_path
+            logger.debug('Yielding contains dir for sub path "%s"', rel_sub_path)
+            yield rel_sub_path, abs_sub_path
         else:
-            logger.debug(f'Sub path "{rel_sub_path}" is not a directory, skipping')
+            logger.debug('Sub path "%s" is not a directory, skipping', rel_sub_path)
             return
 
-    @classmethod
-    def yield_siblings_dir(cls, rel_sub_path: pl.Path) -> tt.PathGen:
+    def yield_siblings_dir(self, rel_sub_path: pl.Path, abs_sub_path: pl.Path) -> tt.PathPairGen:
+        """Given a co-normalized relative and absolute sub path, yields the relative and absolute paths of the
+        directory containing the item meta file for that sub path, if any.
+        """
         par_dir = rel_sub_path.parent
         if par_dir != rel_sub_path:
-            logger.debug(f'Yielding siblings dir for sub path "{rel_sub_path}"')
-            yield par_dir
+            logger.debug('Yielding siblings dir for sub path "%s"', rel_sub_path)
+            yield par_dir, abs_sub_path.parent
         else:
-            logger.debug(f'Sub path "{rel_sub_path}" is at relative root, skipping')
+            logger.debug('Sub path "%s" is at relative root, skipping', rel_sub_path)
             return
 
-    @classmethod
-    def fuzzy_name_lookup(cls, *, rel_sub_dir_path: pl.Path, prefix_item_name: str) -> str:
-        rel_sub_dir_path, abs_sub_dir_path = cls.co_norm(rel_sub_path=rel_sub_dir_path)
-
-        pattern = f'{prefix_item_name}*'
-        results = tuple(abs_sub_dir_path.glob(pattern))
-
-        if len(results) != 1:
+    def fuzzy_name_lookup(self, *, rel_sub_dir_path: pl.Path, prefix_item_name: str,
+                          sorted_entry_names: typ.Optional[typ.Sequence[str]]=None) -> str:
+        """Finds the single entry in a directory whose name starts with a given prefix.
+        If the sorted names of the directory entries are already known, they can be passed in to avoid listing the
+        directory.
+        """
+        # Only listing the directory needs a normalized path, and that normalizes the path itself.
+        if sorted_entry_names is None:
+            sorted_entry_names = self.entry_names_in_dir(rel_sub_dir_path=rel_sub_dir_path)
+
+        # All names starting with the prefix are contiguous in sorted order, starting at the insertion point of the
+        # prefix itself, so only those names need to be looked at.
+        num_entry_names = len(sorted_entry_names)
+        lo = bisect.bisect_left(sorted_entry_names, prefix_item_name)
+        hi = lo
+        while hi < num_entry_names and sorted_entry_names[hi].startswith(prefix_item_name):
+            hi += 1
+
+        if hi - lo != 1:
             msg = (f'Incorrect number of matches for fuzzy lookup of "{prefix_item_name}" '
                    f'in directory "{rel_sub_dir_path}"; '
-                   f'expected: 1, found: {len(results)}')
+                   f'expected: 1, found: {hi - lo}')
             logger.error(msg)
             raise tex.NonUniqueFuzzyFileLookup(msg)
 
-        abs_found_path = results[0]
-        return abs_found_path.name
+        return sorted_entry_names[lo]
+
+    def entry_names_in_dir(self, rel_sub_dir_path: pl.Path) -> typ.Sequence[str]:
+        """Lists the names of all entries in a given directory in sorted order, unfiltered.
+        A non-directory has no entries.
+        """
+        rel_sub_dir_path, abs_sub_dir_path = self.co_norm(rel_sub_path=rel_sub_dir_path)
 
-    @classmethod
-    def yield_item_paths_in_dir(cls, rel_sub_dir_path: pl.Path) -> tt.PathGen:
-        rel_sub_dir_path, abs_sub_dir_path = cls.co_norm(rel_sub_path=rel_sub_dir_path)
-        root_dir = cls.get_root_dir()
+        # Listing a non-directory fails, so no separate directory check is needed beforehand.
+        try:
+            return tuple(sorted(os.listdir(abs_sub_dir_path)))
+        except (FileNotFoundError, NotADirectoryError):
+            return ()
+
+    def yield_item_paths_in_dir(self, rel_sub_dir_path: pl.Path) -> tt.PathGen:
+        for abs_item_path, _ in self.yield_item_entries_in_dir(rel_sub_dir_path=rel_sub_dir_path):
+            yield abs_item_path
+
+    def yield_item_entries_in_dir(self,
+                                  rel_sub_dir_path: pl.Path) -> typ.Generator[typ.Tuple[pl.Path, bool], None, None]:
+        """Yields the absolute paths of eligible items in a given directory, along with whether each item is a
+        directory. The latter is taken from the directory listing, which usually avoids a separate stat call.
+        """
+        rel_sub_dir_path, abs_sub_dir_path = self.co_norm(rel_sub_path=rel_sub_dir_path)
 
-        logger.info(f'Looking for valid items in directory "{rel_sub_dir_path}"')
+        logger.info('Looking for valid items in directory "%s"', rel_sub_dir_path)
 
-        media_item_filter = cls.get_media_item_filter()
+        media_item_filter = self.media_item_filter
 
         # Make sure the path is a directory.
-        # If not, we yield nothing.
-        if abs_sub_dir_path.is_dir():
-            for abs_item_path in abs_sub_dir_path.iterdir():
-                rel_item_path = abs_item_path.relative_to(root_dir)
+        # If not, we yield nothing. Scanning a non-directory fails, so no separate directory check is needed beforehand.
+        try:
+            entries = os.scandir(abs_sub_dir_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        # Using scandir instead of iterdir avoids building intermediate paths for each entry, and the relative item
+        # path can be built directly from the entry name, since the containing relative path is already normalized.
+        with entries:
+            for entry in entries:
+                item_name = entry.name
+                abs_item_path = abs_sub_dir_path / item_name
 
+                # The relative item path is not built here, since it would only be used for logging.
                 if media_item_filter is not None:
                     if media_item_filter(abs_item_path):
-                        logger.debug(f'Item "{rel_item_path}" passed filter, marking as eligible')
-                        yield abs_item_path
+                        logger.debug('Item "%s" in "%s" passed filter, marking as eligible', item_name,
+                                     rel_sub_dir_path)
+                        yield abs_item_path, entry.is_dir()
                     else:
-                        logger.debug(f'Item "{rel_item_path}" failed filter, skipping')
+                        logger.debug('Item "%s" in "%s" failed filter, skipping', item_name, rel_sub_dir_path)
                 else:
-                    logger.debug(f'Marking item "{rel_item_path}" as eligible')
-                    yield abs_item_path
+                    logger.debug('Marking item "%s" in "%s" as eligible', item_name, rel_sub_dir_path)
+                    yield abs_item_path, entry.is_dir()
+
+    def dir_cache_key(self, rel_sub_dir_path: pl.Path) -> typ.Tuple[pl.Path, typ.Optional[DirStamp]]:
+        """Returns the key used to cache results for a given directory, consisting of the normalized relative
+        directory path and the stamp of the directory, if it exists.
+        """
+        rel_sub_dir_path, abs_sub_dir_path = self.co_norm(rel_sub_path=rel_sub_dir_path)
+
+        try:
+            ds = dir_stamp(os.stat(abs_sub_dir_path))
+        except OSError:
+            ds = None
+
+        return rel_sub_dir_path, ds
+
+    def scan_item_names_in_dir(self, rel_sub_dir_path: pl.Path) -> ItemNameScan:
+        """Finds item names in a given directory in a single pass, and returns them both as a set and as a sequence
+        sorted using the media item sort key. These items must pass a filter in order to be selected.
+        """
+        dir_scan = self.scan_dir_cached(*self.dir_cache_key(rel_sub_dir_path=rel_sub_dir_path))
+        return dir_scan.item_names, dir_scan.sorted_item_names
+
+    def scan_dir_uncached(self, rel_sub_dir_path: pl.Path) -> DirScan:
+        media_item_sort_key: tt.ItemSortKey = self.media_item_sort_key
+
+        item_paths: typ.List[pl.Path] = []
+        dir_item_names: typ.Set[str] = set()
+        for abs_item_path, is_dir in self.yield_item_entries_in_dir(rel_sub_dir_path=rel_sub_dir_path):
+            item_paths.append(abs_item_path)
+            if is_dir:
+                dir_item_names.add(abs_item_path.name)
+
+        item_paths.sort(key=media_item_sort_key)
 
-    @classmethod
-    def item_names_in_dir(cls, rel_sub_dir_path: pl.Path) -> typ.AbstractSet[str]:
+        # Scans are cached, and names like "01.flac" recur across many directories, so the names are interned.
+        sorted_item_names = tuple(sys.intern(p.name) for p in item_paths)
+        return DirScan(item_names=frozenset(sorted_item_names), sorted_item_names=sorted_item_names,
+                       dir_item_names=frozenset(dir_item_names))
+
+    def item_names_in_dir(self, rel_sub_dir_path: pl.Path) -> typ.AbstractSet[str]:
         """Finds item names in a given directory. These items must pass a filter in order to be selected."""
-        return frozenset(p.name for p in cls.yield_item_paths_in_dir(rel_sub_dir_path=rel_sub_dir_path))
+        item_names, _ = self.scan_item_names_in_dir(rel_sub_dir_path=rel_sub_dir_path)
+        return item_names
 
-    @classmethod
-    def sorted_item_names_in_dir(cls, rel_sub_dir_path: pl.Path) -> typ.Sequence[str]:
-        media_item_sort_key: tt.ItemSortKey = cls.get_media_item_sort_key()
+    def sorted_item_names_in_dir(self, rel_sub_dir_path: pl.Path) -> typ.Sequence[str]:
+        _, sorted_item_names = self.scan_item_names_in_dir(rel_sub_dir_path=rel_sub_dir_path)
+        return sorted_item_names
 
-        results = tuple(p.name for p in sorted(cls.yield_item_paths_in_dir(rel_sub_dir_path=rel_sub_dir_path),
-                                               key=media_item_sort_key))
-        return results
+    def sorted_item_paths_in_dir(self, rel_sub_dir_path: pl.Path) -> typ.Sequence[pl.Path]:
+        """Same as sorted_item_names_in_dir, but returns the relative paths of the items instead of their names."""
+        return self.sorted_item_paths_in_dir_cached(*self.dir_cache_key(rel_sub_dir_path=rel_sub_dir_path))
 
-    @classmethod
-    def yield_item_meta_pairs(cls, yaml_data: typ.Any, rel_sub_dir_path: pl.Path) -> tt.PathMetadataPairGen:
-        rel_sub_dir_path, abs_sub_dir_path = cls.co_norm(rel_sub_path=rel_sub_dir_path)
+    def dir_item_paths_in_dir(self, rel_sub_dir_path: pl.Path) -> typ.AbstractSet[pl.Path]:
+        """Returns the relative paths of the items in a given directory that are themselves directories."""
+        return self.dir_item_paths_in_dir_cached(*self.dir_cache_key(rel_sub_dir_path=rel_sub_dir_path))
 
-        # Find eligible item names in this directory.
-        item_names: typ.AbstractSet[str] = cls.item_names_in_dir(rel_sub_dir_path=rel_sub_dir_path)
+    def yield_item_meta_pairs(self, yaml_data: typ.Any, rel_sub_dir_path: pl.Path) -> tt.PathMetadataPairGen:
+        # Find eligible item names in this directory, both as a set and in sorted order.
+        # The cache key starts with the normalized directory path, so the path does not need normalizing separately.
+        dir_cache_key = self.dir_cache_key(rel_sub_dir_path=rel_sub_dir_path)
+        rel_sub_dir_path = dir_cache_key[0]
+        dir_scan = self.scan_dir_cached(*dir_cache_key)
+        item_names = dir_scan.item_names
 
         # File metadata can be either a dictionary or sequence.
-        if isinstance(yaml_data, collections.abc.Sequence):
+        # A sequence may also be provided as an iterator, in which case its metadata blocks are consumed lazily.
+        if isinstance(yaml_data, (collections.abc.Sequence, collections.abc.Iterator)):
             # Performing sequential application of metadata to interesting items.
+            sorted_item_paths = self.sorted_item_paths_in_dir_cached(*dir_cache_key)
+            num_item_names = len(sorted_item_paths)
+            num_meta_blocks = 0
+            for num_meta_blocks, meta_block in enumerate(yaml_data, start=1):
+                if num_meta_blocks <= num_item_names:
+                    yield sorted_item_paths[num_meta_blocks - 1], meta_block
+
             # Check that there are an equal number of metadata entries and interesting items.
             # TODO: Perform this check for mappings as well.
-            if len(item_names) != len(yaml_data):
+            if num_item_names != num_meta_blocks:
                 logger.warning(f'Counts of items in directory and metadata blocks do not match; '
-                               f'found {th.pluralize(len(item_names), "item")} '
-                               f'and {th.pluralize(len(yaml_data), "metadata block")}')
-
-            media_item_sort_key = cls.get_media_item_sort_key()
-            sorted_item_names: typ.Sequence[str] = tuple(sorted(item_names, key=media_item_sort_key))
-
-            for item_name, meta_block in zip(sorted_item_names, yaml_data):
-                rel_item_path = rel_sub_dir_path / item_name
-                yield rel_item_path, meta_block
+                               f'found {th.pluralize(num_item_names, "item")} '
+                               f'and {th.pluralize(num_meta_blocks, "metadata block")}')
 
         elif isinstance(yaml_data, collections.abc.Mapping):
             # Performing mapped application of metadata to interesting items.
+            # List the directory once up front, instead of once per fuzzy lookup.
+            sorted_entry_names: typ.Sequence[str] = self.entry_names_in_dir(rel_sub_dir_path=rel_sub_dir_path)
+
+            # Item paths are reused from the cached listing, instead of joining the directory path and name per entry.
+            sorted_item_paths = self.sorted_item_paths_in_dir_cached(*dir_cache_key)
+            item_paths_by_name: typ.Mapping[str, pl.Path] = dict(zip(dir_scan.sorted_item_names, sorted_item_paths))
             processed_item_names = set()
             for item_name, meta_block in yaml_data.items():
                 # Test if item name from metadata has a valid name.
@@ -172,7 +357,8 @@ class LibraryContext(abc.ABC):
                     logger.warning(f'Item name "{item_name}" is not valid, skipping')
                     continue
 
-                item_name = cls.fuzzy_name_lookup(rel_sub_dir_path=rel_sub_dir_path, prefix_item_name=item_name)
+                item_name = self.fuzzy_name_lookup(rel_sub_dir_path=rel_sub_dir_path, prefix_item_name=item_name,
+                                                   sorted_entry_names=sorted_entry_names)
 
                 # Warn if name was already processed.
                 if item_name in processed_item_names:
@@ -180,12 +366,12 @@ class LibraryContext(abc.ABC):
                     continue
 
                 # Test if the item name is in the list of discovered item names.
-                if item_name not in item_names:
+                rel_item_path = item_paths_by_name.get(item_name)
+                if rel_item_path is None:
                     logger.warning(f'Item "{item_name}" not found in eligible item names for this directory, '
                                    f'skipping')
                     continue
 
-                rel_item_path = rel_sub_dir_path / item_name
                 yield rel_item_path, meta_block
                 processed_item_names.add(item_name)
 
@@ -194,24 +380,21 @@ class LibraryContext(abc.ABC):
                 logger.warning(f'Found {th.pluralize(len(remaining_item_names), "eligible item")} '
                                f'remaining not referenced in metadata')
 
-    @classmethod
-    def yield_self_meta_pairs(cls, yaml_data: typ.Any, rel_sub_dir_path: pl.Path) -> tt.PathMetadataPairGen:
+    def yield_self_meta_pairs(self, yaml_data: typ.Any, rel_sub_dir_path: pl.Path) -> tt.PathMetadataPairGen:
         # The target of the self metadata is the folder containing the self metadata file.
         if isinstance(yaml_data, collections.abc.Mapping):
             yield rel_sub_dir_path, yaml_data
 
-    @classmethod
-    def yield_meta_source_specs(cls) -> tt.MetaSourceSpecGen:
+    def yield_meta_source_specs(self) -> tt.MetaSourceSpecGen:
         """Yields the meta source specifications for where to obtain data.
         The order these specifications are emitted designates their priority;
         earlier is higher priority in the case of a conflict.
         """
-        yield tt.MetaSourceSpec(meta_file_name=pl.Path(cls.get_self_meta_file_name()),
-                                dir_getter=cls.yield_contains_dir,
-                                multiplexer=cls.yield_self_meta_pairs)
-        yield tt.MetaSourceSpec(meta_file_name=pl.Path(cls.get_item_meta_file_name()),
-                                dir_getter=cls.yield_siblings_dir,
-                                multiplexer=cls.yield_item_meta_pairs)
+        yield from self.meta_source_specs
+
+    def get_meta_source_spec(self, *, meta_file_name: str) -> typ.Optional[tt.MetaSourceSpec]:
+        """Returns the meta source specification for a given meta file name, or None if there is no match."""
+        return self.meta_source_specs_by_name.get(meta_file_name)
 
 
 def gen_library_ctx(*,
@@ -223,25 +406,6 @@ def gen_library_ctx(*,
     # Expand user dir directives (~ and ~user), collapse dotted (. and ..) entries in path, and absolute-ize.
     root_dir = pl.Path(os.path.abspath(os.path.expanduser(root_dir)))
 
-    class LC(LibraryContext):
-        @classmethod
-        def get_root_dir(cls) -> pl.Path:
-            return root_dir
-
-        @classmethod
-        def get_item_meta_file_name(cls) -> str:
-            return item_meta_file_name
-
-        @classmethod
-        def get_self_meta_file_name(cls) -> str:
-            return self_meta_file_name
-
-        @classmethod
-        def get_media_item_filter(cls) -> typ.Optional[tt.ItemFilter]:
-            return media_item_filter
-
-        @classmethod
-        def get_media_item_sort_key(cls) -> typ.Optional[tt.ItemSortKey]:
-            return media_item_sort_key
-
-    return LC()
+    return LibraryContext(root_dir=root_dir, media_item_filter=media_item_filter,
+                          media_item_sort_key=media_item_sort_key, self_meta_file_name=self_meta_file_name,
+                          item_meta_file_name=item_meta_file_name)
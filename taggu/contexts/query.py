@@ -1,8 +1,12 @@
-import abc
+import os
 import pathlib as pl
+import stat
 import typing as typ
 import collections.abc
 import enum
+import functools as ft
+import operator
+import sys
 
 import taggu.contexts.library as tlib
 import taggu.contexts.discovery as td
@@ -14,24 +18,58 @@ import taggu.helpers as th
 logger = tl.get_logger(__name__)
 
 Label = str
-LabelContainer = typ.Container[Label]
+LabelContainer = typ.Collection[Label]
+LabelSet = typ.AbstractSet[Label]
 LabelExtractor = typ.Callable[[pl.Path], str]
 
 FieldValueGen = typ.Generator[tt.FieldValue, None, None]
+ItemFieldValueGen = typ.Generator[typ.Tuple[pl.Path, tt.FieldValue], None, None]
 
-MappingIterFunc = typ.Callable[[typ.Mapping], typ.Generator[typ.Any, None, None]]
+MappingIterFunc = typ.Callable[[typ.Mapping], typ.Iterable[typ.Any]]
 
+# Stands in for a field or field value that is not present, since None is a valid field value.
+MISSING = object()
 
-def mis_keys(d: typ.Mapping) -> typ.Generator[typ.Any, None, None]:
-    yield from d.keys()
+# Field values loaded from YAML are nearly always one of these concrete types, which can be checked by identity.
+CONCRETE_FIELD_TYPES = frozenset((type(None), str, list, tuple, dict))
 
 
-def mis_vals(d: typ.Mapping) -> typ.Generator[typ.Any, None, None]:
-    yield from d.values()
+def normalize_labels(labels: typ.Optional[LabelContainer]) -> typ.Optional[LabelSet]:
+    """Converts a collection of labels into a set, if not one already, so that checking labels is fast.
+    A single string is rejected, since it would otherwise be split into a set of its characters.
+    """
+    if labels is None or isinstance(labels, (set, frozenset)):
+        return labels
+    if isinstance(labels, str):
+        raise TypeError(f'Labels must be a collection of strings, not a single string: "{labels}"')
+    return frozenset(labels)
 
 
-def mis_pairs(d: typ.Mapping) -> typ.Generator[typ.Any, None, None]:
-    yield from d.items()
+def normalize_field_name(field_name: str) -> str:
+    """Interns a field name, so that it matches the (also interned) keys of loaded meta files by identity."""
+    if type(field_name) is str:
+        return sys.intern(field_name)
+    return field_name
+
+
+def canonical_field_type(field_val: typ.Any) -> type:
+    """Maps a field value that is not of a concrete field type onto the concrete type it should be treated as, using
+    the (comparatively slow) ABC instance checks.
+    """
+    if isinstance(field_val, str):
+        return str
+    if isinstance(field_val, collections.abc.Sequence):
+        return list
+    if isinstance(field_val, collections.abc.Mapping):
+        return dict
+    return type(field_val)
+
+
+# These call the mapping methods directly, without wrapping the results in a generator.
+# Unlike plain functions, method callers are not descriptors, so they become proper members of the enum below.
+mis_keys: MappingIterFunc = operator.methodcaller('keys')
+mis_vals: MappingIterFunc = operator.methodcaller('values')
+mis_pairs: MappingIterFunc = operator.methodcaller('items')
 
 
 class MappingIterStyle(enum.Enum):
@@ -42,104 +80,219 @@ class MappingIterStyle(enum.Enum):
 
 def field_flattener(*, field_value: typ.Union[None, str, typ.Sequence, typ.Mapping], flatten_limit: typ.Optional[int],
                     mapping_iter_style: MappingIterStyle):
-    next_fl: typ.Optional[int] = (flatten_limit - 1) if flatten_limit is not None else None
-
-    if field_value is None:
-        # Just yield None.
-        yield None
-    # TODO: Need to check for bytes as well?
-    elif isinstance(field_value, str):
-        # Just yield the value.
-        yield field_value
-    elif isinstance(field_value, collections.abc.Sequence):
-        if flatten_limit is None or flatten_limit > 0:
-            for i in field_value:
-                yield from field_flattener(field_value=i, flatten_limit=next_fl, mapping_iter_style=mapping_iter_style)
-        else:
-            yield field_value
-    elif isinstance(field_value, collections.abc.Mapping):
-        if flatten_limit is None or flatten_limit > 0:
-            mis: MappingIterFunc = mapping_iter_style
-            for i in mis(field_value):
-                yield from field_flattener(field_value=i, flatten_limit=next_fl, mapping_iter_style=mapping_iter_style)
+    mis: MappingIterFunc = mapping_iter_style.value
+
+    # Nested values are flattened using an explicit stack instead of recursion.
+    # Each entry is an iterator over values to be flattened, along with the flatten limit for those values.
+    stack = [(iter((field_value,)), flatten_limit)]
+    while stack:
+        values, fl = stack[-1]
+        for value in values:
+            value_type = type(value)
+            if value_type not in CONCRETE_FIELD_TYPES:
+                value_type = canonical_field_type(value)
+
+            # TODO: Need to check for bytes as well?
+            if value is None or value_type is str:
+                # Just yield the value.
+                yield value
+            elif value_type is list or value_type is tuple or value_type is dict:
+                if fl is None or fl > 0:
+                    # Descend into this value, and resume with the remaining values once it is exhausted.
+                    next_fl: typ.Optional[int] = (fl - 1) if fl is not None else None
+                    children = mis(value) if value_type is dict else value
+                    stack.append((iter(children), next_fl))
+                    break
+                else:
+                    yield value
         else:
-            yield field_value
+            stack.pop()
+
+
+@ft.lru_cache(maxsize=4096)
+def dir_and_ancestor_paths(rel_dir_path: pl.Path) -> typ.Sequence[pl.Path]:
+    """Returns a relative directory path followed by its ancestors, nearest first."""
+    rel_parent_path = rel_dir_path.parent
+    if rel_parent_path == rel_dir_path:
+        return (rel_dir_path,)
+
+    return (rel_dir_path,) + dir_and_ancestor_paths(rel_parent_path)
+
+
+def ancestor_paths(rel_item_path: pl.Path) -> typ.Sequence[pl.Path]:
+    """Returns the ancestors of a relative item path, nearest first. Results are cached per directory, so items in the
+    same directory share the same ancestor paths.
+    """
+    rel_parent_path = rel_item_path.parent
+    if rel_parent_path == rel_item_path:
+        return ()
 
+    return dir_and_ancestor_paths(rel_parent_path)
 
-class QueryContext(abc.ABC):
+
+class QueryContext:
     """Handles retrieving individual fields from metadata for an item."""
+    __slots__ = ('discovery_context', 'label_extractor', 'label_extractor_cached', 'meta_cacher', 'meta_file_cache')
+
+    def __init__(self, discovery_context: td.DiscoveryContext, label_extractor: typ.Optional[LabelExtractor],
+                 meta_cacher: typ.Optional[tmc.MetaCacher]):
+        self.discovery_context = discovery_context
+        self.label_extractor = label_extractor
+        self.meta_cacher = meta_cacher
+
+        # Labels only depend on item paths, and parent and child walks check the same items over and over again.
+        self.label_extractor_cached: typ.Optional[LabelExtractor] = None
+        if label_extractor is not None:
+            self.label_extractor_cached = ft.lru_cache(maxsize=4096)(label_extractor)
 
-    @classmethod
-    @abc.abstractmethod
-    def get_discovery_context(cls) -> td.DiscoveryContext:
+        # Without a meta cacher, parsed meta files are still reused, but only until they are modified.
+        # Each entry is keyed on the modification time and size of its meta file.
+        self.meta_file_cache: typ.MutableMapping[pl.Path,
+                                                 typ.Tuple[typ.Optional[typ.Tuple[int, int]], tmc.MetadataCache]] = {}
+
+    def get_discovery_context(self) -> td.DiscoveryContext:
         """Returns the discovery context used in this lookup context."""
-        pass
+        return self.discovery_context
 
-    @classmethod
-    @abc.abstractmethod
-    def get_label_extractor(cls) -> typ.Optional[LabelExtractor]:
+    def get_label_extractor(self) -> typ.Optional[LabelExtractor]:
         """Returns the label extractor used in this lookup context."""
-        pass
+        return self.label_extractor
+
+    def get_meta_cacher(self) -> typ.Optional[tmc.MetaCacher]:
+        return self.meta_cacher
+
+    def load_meta_file(self, rel_meta_path: pl.Path) -> tmc.MetadataCache:
+        """Returns the items and metadata provided by a meta file, reusing the results of a previous load if the meta
+        file has not been modified since then.
+        """
+        lib_ctx: tlib.LibraryContext = self.discovery_context.get_library_context()
+        rel_meta_path, abs_meta_path = lib_ctx.co_norm(rel_sub_path=rel_meta_path)
+
+        # The size is checked as well, since a modification time alone can miss quick successive writes.
+        try:
+            st = os.stat(abs_meta_path)
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat_key = None
+
+        entry = self.meta_file_cache.get(rel_meta_path)
+        if entry is not None and stat_key is not None and entry[0] == stat_key:
+            return entry[1]
+
+        mc: tmc.MetadataCache = dict(self.discovery_context.items_from_meta_file(rel_meta_path=rel_meta_path))
+        self.meta_file_cache[rel_meta_path] = (stat_key, mc)
+        return mc
+
+    def meta_files_from_item(self, rel_item_path: pl.Path) -> tt.PathGen:
+        """Yields the existing meta files that could provide direct metadata for an item, using the meta cacher if
+        there is one.
+        """
+        meta_cacher: typ.Optional[tmc.MetaCacher] = self.meta_cacher
+        if meta_cacher is not None:
+            return meta_cacher.meta_files_from_item(rel_item_path)
+        return self.discovery_context.meta_files_from_item(rel_item_path)
+
+    def try_load_meta_file(self, rel_meta_path: pl.Path):
+        """Same as load_meta_file, but meta files that fail to load are logged and left out of the cache."""
+        try:
+            self.load_meta_file(rel_meta_path=rel_meta_path)
+        except Exception as e:
+            logger.debug('Unable to preload meta file "%s", leaving it out of the cache: %s', rel_meta_path, e)
+
+    def preload_meta_files(self, rel_meta_paths: typ.Iterable[pl.Path]):
+        """Loads meta files ahead of time, in parallel where possible, so that later lookups can reuse the results.
+        This is best-effort: meta files that fail to load are skipped here, and only raise if a later lookup reads them.
+        """
+        meta_cacher: typ.Optional[tmc.MetaCacher] = self.meta_cacher
+        if meta_cacher is not None:
+            meta_cacher.cache_meta_files(rel_meta_paths=rel_meta_paths, ignore_errors=True)
+            return
+
+        rel_meta_paths = tuple(th.dedupe(rel_meta_paths))
+        if len(rel_meta_paths) > 1:
+            # Each meta file is stored under its own key, so loading them from worker threads is safe.
+            for _ in tmc.META_FILE_LOADER_POOL.map(self.try_load_meta_file, rel_meta_paths):
+                pass
+
+    def item_meets_labels(self, *, rel_item_path: pl.Path, labels: typ.Optional[LabelContainer]) -> bool:
+        """Checks if the label of an item is one of the given labels. If no labels or no label extractor are given,
+        every item is accepted.
+        """
+        label_extractor: typ.Optional[LabelExtractor] = self.label_extractor_cached
 
-    @classmethod
-    @abc.abstractmethod
-    def get_meta_cacher(cls) -> typ.Optional[tmc.MetaCacher]:
-        pass
+        if labels is None or label_extractor is None:
+            return True
 
-    @classmethod
-    def yield_field(cls, *,
+        logger.debug('Checking if item path "%s" meets label requirements', rel_item_path)
+        extracted_label = label_extractor(rel_item_path)
+        if extracted_label not in labels:
+            logger.debug('Item "%s" with label "%s" did not match any expected labels, skipping',
+                         rel_item_path, extracted_label)
+            return False
+
+        return True
+
+    def yield_field(self, *,
                     rel_item_path: pl.Path,
                     field_name: str,
                     labels: typ.Optional[LabelContainer],
                     mapping_iter_style: MappingIterStyle,
-                    recursive: bool=True) -> FieldValueGen:
+                    recursive: bool=True,
+                    check_labels: bool=True,
+                    rel_meta_paths: typ.Optional[typ.Iterable[pl.Path]]=None) -> FieldValueGen:
         """Given a relative item path and a field name, yields metadata entries matching that field for that item.
         Only direct metadata for that item is looked up, no parent or child metadata is used.
+        If the caller has already checked the item against the labels, passing check_labels=False skips doing so again.
+        Likewise, if the caller has already found the meta files for the item, they can be passed in as rel_meta_paths.
         """
-        label_extractor: LabelExtractor = cls.get_label_extractor()
-        discovery_context: td.DiscoveryContext = cls.get_discovery_context()
-
-        if labels is not None and label_extractor is not None:
-            logger.debug(f'Checking if item path "{rel_item_path}" meets label requirements')
-            if label_extractor(rel_item_path) not in labels:
-                extracted_label = label_extractor(rel_item_path)
-                if extracted_label not in labels:
-                    logger.info(f'Item "{rel_item_path}" with label "{extracted_label}" '
-                                f'did not match any expected labels, skipping')
-                    return
+        # The meta cacher is fixed for this query context, so it is bound to a local once per call.
+        meta_cacher: typ.Optional[tmc.MetaCacher] = self.meta_cacher
 
-        meta_cacher: typ.Optional[tmc.MetaCacher] = cls.get_meta_cacher()
+        # Labels only need checking if there are both labels and a way to extract them.
+        check_labels = check_labels and labels is not None and self.label_extractor is not None
+        if check_labels and not self.item_meets_labels(rel_item_path=rel_item_path, labels=labels):
+            return
 
-        for rel_meta_path in discovery_context.meta_files_from_item(rel_item_path):
+        if rel_meta_paths is None:
+            rel_meta_paths = self.meta_files_from_item(rel_item_path)
+
+        for rel_meta_path in rel_meta_paths:
             if meta_cacher is not None:
-                meta_cacher.cache_meta_file(rel_meta_path=rel_meta_path)
-                temp_cache = meta_cacher.get_meta_file(rel_meta_path=rel_meta_path)
+                # Meta files that are already cached are looked up directly, without going through the caching logic.
+                # Meta files that provide no metadata are never stored in the cache, so they may still be missing.
+                mfc: tmc.MetaFileCache = meta_cacher.get_cache()
+                temp_cache = mfc.get(rel_meta_path)
+                if temp_cache is None:
+                    meta_cacher.cache_meta_file(rel_meta_path=rel_meta_path)
+                    temp_cache = mfc.get(rel_meta_path, {})
             else:
-                temp_cache: typ.MutableMapping[pl.Path, tt.Metadata] = {
-                    k: v for k, v in discovery_context.items_from_meta_file(rel_meta_path=rel_meta_path)
-                }
+                temp_cache = self.load_meta_file(rel_meta_path=rel_meta_path)
 
-            if rel_item_path in temp_cache:
-                meta_dict = temp_cache[rel_item_path]
+            meta_dict = temp_cache.get(rel_item_path)
+            if meta_dict is not None:
+                # Fields may have None as a value, so a sentinel is used to tell missing fields apart in one lookup.
+                field_val = meta_dict.get(field_name, MISSING)
 
-                if field_name in meta_dict:
-                    logger.debug(f'Found field "{field_name}" for item "{rel_item_path}" '
-                                 f'in meta file "{rel_meta_path}"')
+                if field_val is not MISSING:
+                    logger.debug('Found field "%s" for item "%s" in meta file "%s"',
+                                 field_name, rel_item_path, rel_meta_path)
 
-                    field_val = meta_dict[field_name]
+                    field_type = type(field_val)
+                    if field_type not in CONCRETE_FIELD_TYPES:
+                        field_type = canonical_field_type(field_val)
 
                     if field_val is None:
                         yield None
-                    elif isinstance(field_val, str):
+                    elif field_type is str:
                         yield field_val
-                    elif isinstance(field_val, collections.abc.Sequence):
+                    elif field_type is list or field_type is tuple:
                         if recursive:
                             # Recursively flatten the iterables.
                             yield from th.recursive_flatten(field_val)
                         else:
                             # Flatten only this level.
                             yield from field_val
-                    elif isinstance(field_val, collections.abc.Mapping):
+                    elif field_type is dict:
                         mis = mapping_iter_style.value
                         i = mis(field_val)
 
@@ -148,78 +301,188 @@ class QueryContext(abc.ABC):
                         else:
                             yield from i
                     else:
-                        logger.warning(f'Field "{field_name}" in meta file "{rel_meta_path}" had unexpected type, '
-                                       f'skipping')
+                        logger.warning('Field "%s" in meta file "%s" had unexpected type, skipping',
+                                       field_name, rel_meta_path)
                         # TODO: Correct to continue, or better to break?
                         continue
 
                     # No need to look at other meta files, just return.
                     return
                 else:
-                    logger.debug(f'Could not find field "{field_name}" for item "{rel_item_path}" '
-                                 f'in meta file "{rel_meta_path}", trying next meta file, if available')
+                    logger.debug('Could not find field "%s" for item "%s" in meta file "%s", '
+                                 'trying next meta file, if available', field_name, rel_item_path, rel_meta_path)
 
             else:
-                logger.warning(f'Could not find item "{rel_item_path}" in meta file "{rel_meta_path}"')
+                logger.warning('Could not find item "%s" in meta file "%s"', rel_item_path, rel_meta_path)
 
-    @classmethod
-    def yield_parent_fields(cls, *,
+    def yield_fields_batch(self, *,
+                           rel_item_paths: typ.Iterable[pl.Path],
+                           field_name: str,
+                           labels: typ.Optional[LabelContainer],
+                           mapping_iter_style: MappingIterStyle) -> ItemFieldValueGen:
+        """Same as yield_field, but for many items at once, yielding each item path along with each field value.
+        The meta files of all of the items are loaded up front, so meta files shared between items are only loaded once.
+        """
+        labels = normalize_labels(labels)
+        field_name = normalize_field_name(field_name)
+        check_labels = labels is not None and self.label_extractor is not None
+
+        # Items that do not meet the labels are skipped before their meta files are looked for or loaded.
+        item_meta_paths: typ.List[typ.Tuple[pl.Path, typ.Sequence[pl.Path]]] = []
+        for rel_item_path in rel_item_paths:
+            if check_labels and not self.item_meets_labels(rel_item_path=rel_item_path, labels=labels):
+                continue
+
+            rel_meta_paths = tuple(self.meta_files_from_item(rel_item_path))
+            if rel_meta_paths:
+                item_meta_paths.append((rel_item_path, rel_meta_paths))
+
+        self.preload_meta_files(rel_meta_path for _, rel_meta_paths in item_meta_paths
+                                for rel_meta_path in rel_meta_paths)
+
+        for rel_item_path, rel_meta_paths in item_meta_paths:
+            for field_val in self.yield_field(rel_item_path=rel_item_path, field_name=field_name, labels=labels,
+                                              mapping_iter_style=mapping_iter_style, check_labels=False,
+                                              rel_meta_paths=rel_meta_paths):
+                yield rel_item_path, field_val
+
+    def yield_parent_fields(self, *,
                             rel_item_path: pl.Path,
                             field_name: str,
                             max_distance: typ.Optional[int]=None,
                             labels: typ.Optional[LabelContainer],
                             mapping_iter_style: MappingIterStyle) -> FieldValueGen:
-        paths = tuple(rel_item_path.parents)
+        # Labels are checked for each ancestor, so they are converted into a set once up front.
+        # Likewise, the field name is looked up for each ancestor, so it is interned once up front.
+        labels = normalize_labels(labels)
+        field_name = normalize_field_name(field_name)
+        paths = ancestor_paths(rel_item_path)
 
         if max_distance is not None and max_distance >= 0:
             paths = paths[:max_distance]
 
-        found = False
+        if not paths:
+            return
+
+        meta_files_from_item = self.meta_files_from_item
+        check_labels = labels is not None and self.label_extractor is not None
+
+        # Most ancestor directories have no meta files at all, and can be skipped without doing a field lookup.
+        # Ancestors that do not meet the labels are skipped before their meta files are looked for or loaded.
+        ancestor_meta_paths: typ.List[typ.Tuple[pl.Path, typ.Sequence[pl.Path]]] = []
         for path in paths:
-            for field_val in cls.yield_field(rel_item_path=path, field_name=field_name, labels=labels,
-                                             mapping_iter_style=mapping_iter_style):
-                yield field_val
-                found = True
+            if check_labels and not self.item_meets_labels(rel_item_path=path, labels=labels):
+                continue
+
+            rel_meta_paths = tuple(meta_files_from_item(path))
+            if rel_meta_paths:
+                ancestor_meta_paths.append((path, rel_meta_paths))
+
+        for i, (path, rel_meta_paths) in enumerate(ancestor_meta_paths):
+            # The nearest ancestor often has the field, so the meta files of the remaining ancestors are only read ahead
+            # of time once it turns out not to, so that slow reads can overlap.
+            if i == 1:
+                self.preload_meta_files(rel_meta_path for _, rmps in ancestor_meta_paths[1:] for rel_meta_path in rmps)
 
-            if found:
-                return
+            gen = self.yield_field(rel_item_path=path, field_name=field_name, labels=labels,
+                                   mapping_iter_style=mapping_iter_style, check_labels=False,
+                                   rel_meta_paths=rel_meta_paths)
 
-    @classmethod
-    def yield_child_fields(cls, *,
+            # Probing for the first value tells whether this ancestor has the field, without needing a flag.
+            first = next(gen, MISSING)
+            if first is MISSING:
+                continue
+
+            yield first
+            yield from gen
+            return
+
+    def yield_child_fields(self, *,
                            rel_item_path: pl.Path,
                            field_name: str,
                            max_distance: typ.Optional[int]=None,
                            labels: typ.Optional[LabelContainer],
                            mapping_iter_style: MappingIterStyle) -> FieldValueGen:
-        # TODO: This function has issues with cyclic folder hierarchies, fix.
-        dis_ctx: td.DiscoveryContext = cls.get_discovery_context()
+        dis_ctx: td.DiscoveryContext = self.discovery_context
         lib_ctx: tlib.LibraryContext = dis_ctx.get_library_context()
 
-        def helper(rip: pl.Path, md: typ.Optional[int]):
-            rip, aip = lib_ctx.co_norm(rel_sub_path=rip)
+        # Labels are checked for each child, so they are converted into a set once up front.
+        # Whether they need checking at all is also decided once, instead of once per child.
+        labels = normalize_labels(labels)
+        check_labels = labels is not None and self.label_extractor is not None
 
-            # Only try and process children if this item is a directory.
-            if aip.is_dir() and (md is None or md > 0):
-                for child_item_name in lib_ctx.sorted_item_names_in_dir(rel_sub_dir_path=rip):
-                    rel_child_path = rip / child_item_name
+        # The field name is looked up for each child, so it is interned once up front.
+        field_name = normalize_field_name(field_name)
 
-                    found = False
-                    field_vals = cls.yield_field(rel_item_path=rel_child_path, field_name=field_name, labels=labels,
-                                                 mapping_iter_style=mapping_iter_style)
+        # Directories are walked depth-first using an explicit stack instead of recursion.
+        # Each entry is an iterator over the child item paths of a directory, along with the child item paths that are
+        # directories, the absolute path of the directory, the max distance remaining for that directory, and the
+        # identity of the directory on disk.
+        stack: typ.List[typ.Tuple[typ.Iterator[pl.Path], typ.AbstractSet[pl.Path], pl.Path, typ.Optional[int],
+                                  typ.Tuple[int, int]]] = []
 
-                    for field_val in field_vals:
-                        yield field_val
-                        found = True
+        # Identities of the directories currently on the stack, used to avoid following cyclic folder hierarchies.
+        active_dir_ids: typ.Set[typ.Tuple[int, int]] = set()
 
-                    if not found:
-                        # If this child did not have the field, try its children.
-                        next_max_distance = md - 1 if md is not None else None
-                        yield from helper(rip=rel_child_path, md=next_max_distance)
+        def enter_dir(rip: pl.Path, aip: pl.Path, md: typ.Optional[int]) -> bool:
+            # Only try and process children if this item is a directory.
+            if md is not None and md <= 0:
+                return False
+
+            # Children only get here if the cached directory listing already marked them as directories, so this is the
+            # single stat call made per directory. Its result supplies both the directory identity used to detect
+            # cycles and the stamp used to key the cached listings.
+            try:
+                st = os.stat(aip)
+            except OSError:
+                return False
+
+            if not stat.S_ISDIR(st.st_mode):
+                return False
+
+            dir_id = (st.st_dev, st.st_ino)
+            if dir_id in active_dir_ids:
+                logger.warning('Directory "%s" is contained within itself, skipping', rip)
+                return False
+
+            # The stat result above already has the directory stamp, so use it directly to key the cached listings.
+            ds = tlib.dir_stamp(st)
+            active_dir_ids.add(dir_id)
+            stack.append((iter(lib_ctx.sorted_item_paths_in_dir_cached(rip, ds)),
+                          lib_ctx.dir_item_paths_in_dir_cached(rip, ds), aip, md, dir_id))
+            return True
+
+        # Only the starting item needs to be normalized. Child paths are built from normalized directory paths and
+        # plain entry names, so they are already normalized.
+        rel_item_path, abs_item_path = lib_ctx.co_norm(rel_sub_path=rel_item_path)
+        enter_dir(rel_item_path, abs_item_path, max_distance)
+
+        while stack:
+            rel_child_paths, rel_child_dir_paths, abs_dir_path, md, dir_id = stack[-1]
+            for rel_child_path in rel_child_paths:
+                # Checking labels here avoids creating a field generator for children that would yield nothing.
+                if not check_labels or self.item_meets_labels(rel_item_path=rel_child_path, labels=labels):
+                    field_vals = self.yield_field(rel_item_path=rel_child_path, field_name=field_name, labels=labels,
+                                                  mapping_iter_style=mapping_iter_style, check_labels=False)
+
+                    # Probing for the first value tells whether this child has the field, without needing a flag.
+                    first = next(field_vals, MISSING)
+                    if first is not MISSING:
+                        yield first
+                        yield from field_vals
+                        continue
 
-        yield from helper(rel_item_path, max_distance)
+                # Children that are not directories (known from the cached directory listing) need no further checks.
+                if rel_child_path in rel_child_dir_paths:
+                    # If this child did not have the field, try its children before moving on to its siblings.
+                    next_max_distance = md - 1 if md is not None else None
+                    if enter_dir(rel_child_path, abs_dir_path / rel_child_path.name, next_max_distance):
+                        break
+            else:
+                stack.pop()
+                active_dir_ids.discard(dir_id)
 
-    # @classmethod
-    # def get_field(cls, *,
+    # def get_field(self, *,
     #               rel_item_path: pl.Path,
     #               field_name: str,
     #               labels: typ.Optional[LabelContainer]):
@@ -238,17 +501,4 @@ def gen_query_ctx(*, discovery_context: td.DiscoveryContext,
     if use_cache:
         meta_cacher = tmc.gen_meta_cacher(discovery_context=discovery_context)
 
-    class QC(QueryContext):
-        @classmethod
-        def get_discovery_context(cls) -> td.DiscoveryContext:
-            return discovery_context
-
-        @classmethod
-        def get_label_extractor(cls) -> typ.Optional[LabelExtractor]:
-            return label_extractor
-
-        @classmethod
-        def get_meta_cacher(cls) -> typ.Optional[tmc.MetaCacher]:
-            return meta_cacher
-
-    return QC()
+    return QueryContext(discovery_context=discovery_context, label_extractor=label_extractor, meta_cacher=meta_cacher)
@@ -3,6 +3,7 @@ import os
 import os.path
 import pathlib as pl
 import collections.abc
+import itertools as it
 
 import yaml
 
@@ -13,56 +14,135 @@ import taggu.yaml.loader as tyl
 logger = tl.get_logger(__name__)
 
 
+# These are used to check item names without splitting them, which is much faster than using os.path.split.
+INVALID_ITEM_NAMES = frozenset(('', os.path.curdir, os.path.pardir))
+ITEM_NAME_SEPARATORS = tuple(sep for sep in (os.sep, os.altsep) if sep)
+ITEM_NAMES_CAN_HAVE_DRIVES = bool(os.path.splitdrive('c:item')[0])
+
+
 def is_valid_item_name(item_file_name: str) -> bool:
-    # Use use os.path here since the initial name will be a string.
+    # Use plain string checks here since the initial name will be a string.
     # Trying to use pathlib here would cause unexpected key folding (e.g. item_name/ -> item_name).
-    head, tail = os.path.split(item_file_name)
 
-    # If tail is empty, then either the path was empty, or it ended in a dir separator.
-    # In either case, that would make the name invalid.
-    if not tail:
+    # An empty name, or a curdir or pardir item, is invalid.
+    if item_file_name in INVALID_ITEM_NAMES:
         return False
 
-    # If head is not empty, then either the path contained more than one path segment, or was absolute.
-    # In either case, that would make the name invalid.
-    if head:
-        return False
+    # If the name contains a dir separator, then either it contained more than one path segment, was absolute, or
+    # ended in a dir separator.
+    # In any case, that would make the name invalid.
+    for sep in ITEM_NAME_SEPARATORS:
+        if sep in item_file_name:
+            return False
 
-    # If tail is a curdir or pardir item, that is also invalid.
-    if tail == os.path.pardir or tail == os.path.curdir:
+    # On platforms with drives, a name starting with a drive (e.g. "c:item") is not a plain name either.
+    if ITEM_NAMES_CAN_HAVE_DRIVES and os.path.splitdrive(item_file_name)[0]:
         return False
 
     return True
 
 
 def gen_suffix_item_filter(target_ext: str) -> typ.Callable[[pl.Path], bool]:
+    min_name_len = len(target_ext) + 1
+
     def item_filter(abs_item_path: pl.Path) -> bool:
-        ext = abs_item_path.suffix
-        return (abs_item_path.is_file() and ext == target_ext) or abs_item_path.is_dir()
+        # The extension is checked first, since it does not need a stat call.
+        # Checking the end of the name avoids building the suffix string, and a name consisting of only the extension
+        # has no suffix, same as with Path.suffix.
+        name = abs_item_path.name
+        if len(name) >= min_name_len and name.endswith(target_ext):
+            return abs_item_path.is_file() or abs_item_path.is_dir()
+        return abs_item_path.is_dir()
 
     return item_filter
 
 
 def fuzzy_file_lookup(*, abs_dir_path: pl.Path, prefix_file_name: str) -> pl.Path:
-    pattern = f'{prefix_file_name}*'
-    results = tuple(abs_dir_path.glob(pattern))
+    # The lookup is a plain prefix match, so the names are compared directly instead of through a glob pattern.
+    # This also keeps glob special characters in the prefix from being treated as wildcards.
+    # Scanning a non-directory fails, in which case there are no matches.
+    # Scanning stops at the second match, since the lookup has failed by then.
+    try:
+        with os.scandir(abs_dir_path) as entries:
+            results = list(it.islice((entry.name for entry in entries if entry.name.startswith(prefix_file_name)), 2))
+    except (FileNotFoundError, NotADirectoryError):
+        results = []
 
     if len(results) != 1:
+        found = 'none' if not results else 'more than 1'
         msg = (f'Incorrect number of matches for fuzzy lookup of "{prefix_file_name}" in directory "{abs_dir_path}"; '
-               f'expected: 1, found: {len(results)}')
+               f'expected: 1, found: {found}')
         logger.error(msg)
         raise tex.NonUniqueFuzzyFileLookup(msg)
 
-    return results[0]
+    return abs_dir_path / results[0]
 
 
 def read_yaml_file(abs_yaml_file_path: pl.Path) -> typ.Any:
     logger.debug(f'Opening YAML file "{abs_yaml_file_path}"')
-    with abs_yaml_file_path.open() as f:
-        # TODO: Need to handle nulls as nulls, not as strings.
-        data = yaml.load(f, Loader=tyl.TagguLoader)
+    return load_yaml_bytes(read_file_bytes(abs_yaml_file_path))
+
+
+def read_file_bytes(abs_file_path: pl.Path) -> bytes:
+    # The whole file is read in one call, so that the YAML reader works on a single buffer instead of pulling chunks
+    # from a file object. Reading in binary mode lets the YAML reader detect the encoding itself.
+    with open(abs_file_path, 'rb') as f:
+        return f.read()
+
 
-    return data
+def load_yaml_bytes(yaml_bytes: bytes) -> typ.Any:
+    # TODO: Need to handle nulls as nulls, not as strings.
+    return yaml.load(yaml_bytes, Loader=tyl.FastestTagguLoader)
+
+
+def read_yaml_file_streaming(abs_yaml_file_path: pl.Path) -> typ.Any:
+    """Reads a YAML file, same as read_yaml_file. However, if the top level of the file is a sequence, an iterator is
+    returned instead, which parses and yields one sequence item at a time.
+    """
+    logger.debug(f'Opening YAML file "{abs_yaml_file_path}" for streaming')
+    # Only parsing is deferred; the file itself is read up front, so no file stays open while items are yielded.
+    yaml_bytes = read_file_bytes(abs_yaml_file_path)
+    loader = tyl.FastestTagguStreamLoader(yaml_bytes)
+
+    try:
+        # Skip the stream and document start events, and peek at the event starting the top level node.
+        loader.get_event()
+        is_sequence = False
+        if loader.check_event(yaml.DocumentStartEvent):
+            loader.get_event()
+            is_sequence = loader.check_event(yaml.SequenceStartEvent)
+    except BaseException:
+        loader.dispose()
+        raise
+
+    if not is_sequence:
+        # Anything other than a sequence is loaded as a whole, from the bytes that were already read.
+        loader.dispose()
+        return load_yaml_bytes(yaml_bytes)
+
+    return yield_yaml_sequence_items(loader=loader)
+
+
+def yield_yaml_sequence_items(*, loader: typ.Any) -> typ.Generator[typ.Any, None, None]:
+    """Yields each item of a top level YAML sequence, using a loader that is positioned at the start of the sequence.
+    The loader is disposed of once this generator is exhausted or closed.
+    Same as a full load, a stream with more than one document raises a composer error once the sequence is exhausted.
+    """
+    try:
+        start_event = loader.get_event()
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            yield loader.construct_document(node)
+
+        # Skip the sequence and document end events, and make sure that nothing else follows.
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(yaml.StreamEndEvent):
+            event = loader.get_event()
+            raise yaml.composer.ComposerError('expected a single document in the stream', start_event.start_mark,
+                                              'but found another document', event.start_mark)
+    finally:
+        loader.dispose()
 
 
 def item_discovery(*
@@ -79,19 +159,21 @@ def item_discovery(*
         # If not, we yield nothing.
         nonlocal count
         if abs_dir_path.is_dir():
-            for item in abs_dir_path.iterdir():
-                count += 1
-                item_name = item.name
-
-                if item_filter is not None:
-                    if item_filter(item):
-                        logger.debug(f'Item "{item_name}" passed filter, marking as eligible')
-                        yield item_name
+            # Using scandir instead of iterdir avoids building a path for each entry when there is no filter.
+            with os.scandir(abs_dir_path) as entries:
+                for entry in entries:
+                    count += 1
+                    item_name = entry.name
+
+                    if item_filter is not None:
+                        if item_filter(abs_dir_path / item_name):
+                            logger.debug(f'Item "{item_name}" passed filter, marking as eligible')
+                            yield item_name
+                        else:
+                            logger.debug(f'Item "{item_name}" failed filter, skipping')
                     else:
-                        logger.debug(f'Item "{item_name}" failed filter, skipping')
-                else:
-                    logger.debug(f'Marking item "{item_name}" as eligible')
-                    yield item_name
+                        logger.debug(f'Marking item "{item_name}" as eligible')
+                        yield item_name
 
     vals = frozenset(helper())
     logger.info(f'Found {pluralize(len(vals), "eligible item")} out of {pluralize(count, "possible item")} '
@@ -146,8 +228,21 @@ RecT = typ.Union[T, typ.Iterable['RecT']]
 
 
 def recursive_flatten(iterable: typ.Iterable[RecT]) -> typ.Iterable[T]:
-    for el in iterable:
-        if isinstance(el, collections.abc.Iterable) and not isinstance(el, (str, bytes)):
-            yield from recursive_flatten(el)
+    iterable_type = collections.abc.Iterable
+
+    # Nested iterables are flattened using an explicit stack of iterators instead of recursion.
+    stack = [iter(iterable)]
+    while stack:
+        for el in stack[-1]:
+            # Lists and strings are by far the most common elements, and are checked by identity before falling back
+            # to the (comparatively slow) ABC instance check.
+            el_type = type(el)
+            if el_type is list or (el_type is not str and isinstance(el, iterable_type)
+                                   and not isinstance(el, (str, bytes))):
+                # Descend into this iterable, and resume with the remaining elements once it is exhausted.
+                stack.append(iter(el))
+                break
+            else:
+                yield el
         else:
-            yield el
+            stack.pop()
@@ -1,6 +1,7 @@
 import typing as typ
 import itertools as it
 import functools as ft
+import collections.abc
 
 import taggu.exceptions as tex
 
@@ -17,6 +18,10 @@ class InvalidArgTypeException(tex.TagguException):
     pass
 
 
+# Stands in for a type that is not present, when there are fewer types than arguments.
+MISSING_TYPE = object()
+
+
 def validate_types(args: typ.Sequence,
                    types: typ.Iterable[typ.Union[typ.Type, typ.Sequence[typ.Type]]],
                    more_ok: bool) -> bool:
@@ -25,20 +30,17 @@ def validate_types(args: typ.Sequence,
     """
     num_args = len(args)
 
+    # The arguments and their types are checked in a single pass, without collecting the types first.
+    # If there are fewer types than arguments, the missing types are filled in with a sentinel.
     t_it = iter(types)
-    types_coll = tuple(it.islice(t_it, num_args))
-
-    if len(args) != len(types_coll):
-        return False
+    for a, t in it.zip_longest(args, it.islice(t_it, num_args), fillvalue=MISSING_TYPE):
+        if t is MISSING_TYPE or not isinstance(a, t):
+            return False
 
     if not more_ok:
         for _ in t_it:
             return False
 
-    for a, t in zip(args, types_coll):
-        if not isinstance(a, t):
-            return False
-
     return True
 
 
@@ -61,6 +63,25 @@ def normalize_arg_sequence(args: typ.Sequence, desired_len: int, def_vals: typ.S
 
 def vt_deco_gen(types: typ.Iterable[typ.Union[typ.Type, typ.Sequence[typ.Type]]], more_ok: bool):
     def deco(func: typ.Callable) -> typ.Callable:
+        if isinstance(types, collections.abc.Sequence):
+            # A finite sequence of types is fixed when decorating, so its length is only computed once, and each call
+            # just compares lengths and checks each argument, which is the same as what validate_types does.
+            types_tup = tuple(types)
+            num_types = len(types_tup)
+
+            def wrapped(*args: typ.Any) -> typ.Any:
+                num_args = len(args)
+                if num_args > num_types or (not more_ok and num_args != num_types):
+                    raise InvalidArgTypeException()
+
+                for a, t in zip(args, types_tup):
+                    if not isinstance(a, t):
+                        raise InvalidArgTypeException()
+
+                return func(*args)
+
+            return wrapped
+
         def wrapped(*args: typ.Any) -> typ.Any:
             if not validate_types(args=args, types=types, more_ok=more_ok):
                 raise InvalidArgTypeException()
@@ -2,115 +2,206 @@
 
 import typing as typ
 import pathlib as pl
-import abc
+import concurrent.futures as cf
+import itertools as it
+import multiprocessing as mp
+import os
 
 import taggu.types as tt
 import taggu.contexts.discovery as tcd
+import taggu.helpers as th
+import taggu.logging as tl
+
+logger = tl.get_logger(__name__)
 
 MetadataCache = typ.MutableMapping[pl.Path, tt.Metadata]
 
 MetaFileCache = typ.MutableMapping[pl.Path, MetadataCache]
 
+# Reading and parsing meta files are independent from one another, so a shared pool is used to overlap that work.
+META_FILE_LOADER_POOL = cf.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+
+# Parsing YAML holds the GIL, so on machines with more than one CPU, meta cachers can opt into parsing large batches of
+# meta files in worker processes instead. This is off by default: the workers are always spawned, since forking from a
+# process that is already running loader threads risks deadlocks, and spawned workers re-run the caller's __main__
+# module, which must then be guarded. Parsed meta files are also pickled back, which loses the interning of keys.
+# Starting the processes is comparatively expensive, so the pool is only started once a large enough batch comes along.
+META_FILE_PARSER_POOL_MIN_FILES = 64
+META_FILE_PARSER_POOL_WORKERS = os.cpu_count() or 1
+META_FILE_PARSER_POOL: typ.Optional[cf.ProcessPoolExecutor] = None
+
+
+def get_meta_file_parser_pool() -> cf.ProcessPoolExecutor:
+    global META_FILE_PARSER_POOL
+    if META_FILE_PARSER_POOL is None:
+        META_FILE_PARSER_POOL = cf.ProcessPoolExecutor(max_workers=META_FILE_PARSER_POOL_WORKERS,
+                                                       mp_context=mp.get_context('spawn'))
+    return META_FILE_PARSER_POOL
+
+
+def parse_meta_file(abs_meta_path: pl.Path) -> typ.Any:
+    """Parses a meta file in a worker process. If the meta file cannot be opened or parsed, the exception is returned
+    instead of raised, so that it can be handled in the main process the same way as when reading the meta file there.
+    """
+    try:
+        return th.read_yaml_file(abs_meta_path)
+    except Exception as e:
+        return e
+
+
+def guard_errors(load: typ.Callable[..., MetadataCache]) -> typ.Callable[..., typ.Union[MetadataCache, Exception]]:
+    """Wraps a meta file loading function, so that any exception it raises is returned instead."""
+    def guarded(*args: typ.Any) -> typ.Union[MetadataCache, Exception]:
+        try:
+            return load(*args)
+        except Exception as e:
+            return e
+
+    return guarded
+
+
+class MetaCacher:
+    """Caches the contents of meta files, keyed by the relative paths of the meta files."""
+    __slots__ = ('discovery_context', 'use_process_pool', 'meta_file_cache', 'meta_file_presence')
+
+    def __init__(self, discovery_context: tcd.DiscoveryContext, use_process_pool: bool=False):
+        self.discovery_context = discovery_context
+        self.use_process_pool = use_process_pool
+        self.meta_file_cache: MetaFileCache = {}
+
+        # Whether candidate meta files exist, remembered until they are cleared from this cache.
+        # Sibling items share the same item meta file, so this avoids checking the same file once per sibling.
+        self.meta_file_presence: typ.MutableMapping[pl.Path, bool] = {}
+
+    def get_discovery_context(self) -> tcd.DiscoveryContext:
+        return self.discovery_context
+
+    def get_cache(self) -> MetaFileCache:
+        return self.meta_file_cache
+
+    def meta_files_from_item(self, rel_item_path: pl.Path) -> tt.PathGen:
+        """Same as the method on the discovery context, but remembers which meta files exist."""
+        dis_ctx: tcd.DiscoveryContext = self.get_discovery_context()
+        meta_file_presence = self.meta_file_presence
+
+        for rel_meta_path, abs_meta_path in dis_ctx.candidate_meta_files_from_item(rel_item_path=rel_item_path):
+            exists = meta_file_presence.get(rel_meta_path)
+            if exists is None:
+                exists = tcd.meta_file_exists(rel_meta_path, abs_meta_path, rel_item_path)
+                meta_file_presence[rel_meta_path] = exists
+
+            if exists:
+                yield rel_meta_path
+
+    def meta_files_from_items(self, rel_item_paths: typ.Iterable[pl.Path]) -> typ.Iterator[pl.Path]:
+        return it.chain.from_iterable(map(self.meta_files_from_item, rel_item_paths))
+
+    def cache_meta_files(self, *, rel_meta_paths: typ.Iterable[pl.Path], force: bool=False, ignore_errors: bool=False):
+        """Performs the work to ensure that the data contained in a meta file is present in the cache, if possible.
+        If ignore_errors is set, meta files that fail to load are logged and left out of the cache, instead of raising.
+        """
+        mfc: MetaFileCache = self.get_cache()
+        dis_ctx: tcd.DiscoveryContext = self.get_discovery_context()
+
+        # TODO: See if co-norming is needed here.
+        rel_meta_paths_to_load = tuple(rel_meta_path for rel_meta_path in th.dedupe(rel_meta_paths)
+                                       if force or rel_meta_path not in mfc)
+
+        def load(rel_meta_path: pl.Path) -> MetadataCache:
+            # The per-file mapping is built directly from the multiplexed pairs, without an intermediate sequence.
+            return dict(dis_ctx.items_from_meta_file(rel_meta_path=rel_meta_path))
+
+        def load_parsed(rel_meta_path: pl.Path, parsed: typ.Any) -> MetadataCache:
+            def read_meta_file(_: pl.Path) -> typ.Any:
+                if isinstance(parsed, Exception):
+                    raise parsed
+                return parsed
+
+            return dict(dis_ctx.items_from_meta_file(rel_meta_path=rel_meta_path, read_meta_file=read_meta_file))
+
+        if ignore_errors:
+            load = guard_errors(load)
+            load_parsed = guard_errors(load_parsed)
+
+        # Meta files are loaded in worker threads or processes, but the cache itself is only ever modified in this
+        # thread. Persisted meta files are read through the discovery context, so those are never parsed in processes.
+        num_to_load = len(rel_meta_paths_to_load)
+        if (self.use_process_pool and num_to_load >= META_FILE_PARSER_POOL_MIN_FILES
+                and META_FILE_PARSER_POOL_WORKERS > 1 and dis_ctx.persisted is None):
+            # Only parsing happens in the worker processes, matching items to metadata needs the library context.
+            lib_ctx = dis_ctx.get_library_context()
+            abs_meta_paths = tuple(lib_ctx.co_norm(rel_sub_path=rel_meta_path)[1]
+                                   for rel_meta_path in rel_meta_paths_to_load)
+            # Meta files are sent to the workers in chunks, which cuts down on the overhead of passing them around.
+            chunk_size = max(1, num_to_load // (META_FILE_PARSER_POOL_WORKERS * 4))
+            parsed_meta_files = get_meta_file_parser_pool().map(parse_meta_file, abs_meta_paths, chunksize=chunk_size)
+            loaded_mcs = map(load_parsed, rel_meta_paths_to_load, parsed_meta_files)
+        elif num_to_load > 1:
+            loaded_mcs = META_FILE_LOADER_POOL.map(load, rel_meta_paths_to_load)
+        else:
+            loaded_mcs = map(load, rel_meta_paths_to_load)
+
+        for rel_meta_path, mc in zip(rel_meta_paths_to_load, loaded_mcs):
+            # Remove any existing cached entries. The meta file was just read, so its presence is left as is.
+            mfc.pop(rel_meta_path, None)
 
-class MetaCacher(abc.ABC):
-    @classmethod
-    @abc.abstractmethod
-    def get_discovery_context(cls) -> tcd.DiscoveryContext:
-        pass
-
-    @classmethod
-    @abc.abstractmethod
-    def get_cache(cls) -> MetaFileCache:
-        pass
-
-    @classmethod
-    def cache_meta_files(cls, *, rel_meta_paths: typ.Iterable[pl.Path], force: bool=False):
-        """Performs the work to ensure that the data contained in a meta file is present in the cache, if possible."""
-        mfc: MetaFileCache = cls.get_cache()
-        dis_ctx: tcd.DiscoveryContext = cls.get_discovery_context()
-
-        for rel_meta_path in rel_meta_paths:
-            # TODO: See if co-norming is needed here.
-            if not force and rel_meta_path in mfc:
+            if isinstance(mc, Exception):
+                logger.debug('Unable to load meta file "%s", leaving it out of the cache: %s', rel_meta_path, mc)
                 continue
 
-            # Remove any existing cached entries.
-            cls.clear_meta_file(rel_meta_path=rel_meta_path)
-
             # TODO: Check which makes more sense in the case of an empty loop: an empty dict entry or no dict entry?
-            for rel_item_path, metadata in dis_ctx.items_from_meta_file(rel_meta_path=rel_meta_path):
-                if rel_meta_path not in mfc:
-                    mfc[rel_meta_path] = {}
-
-                mfc[rel_meta_path][rel_item_path] = metadata
+            # The per-file mapping is stored with a single write, instead of looking up the outer cache once per item.
+            if mc:
+                mfc[rel_meta_path] = mc
 
-    @classmethod
-    def cache_meta_file(cls, *, rel_meta_path: pl.Path, force: bool=False):
-        cls.cache_meta_files(rel_meta_paths=(rel_meta_path,), force=force)
+    def cache_meta_file(self, *, rel_meta_path: pl.Path, force: bool=False):
+        self.cache_meta_files(rel_meta_paths=(rel_meta_path,), force=force)
 
-    @classmethod
-    def cache_item_files(cls, *, rel_item_paths: typ.Iterable[pl.Path], force: bool=False):
-        dis_ctx: tcd.DiscoveryContext = cls.get_discovery_context()
+    def cache_item_files(self, *, rel_item_paths: typ.Iterable[pl.Path], force: bool=False):
+        # Find meta files that could provide meta info for these files.
+        self.cache_meta_files(rel_meta_paths=self.meta_files_from_items(rel_item_paths), force=force)
 
-        def func():
-            for rel_item_path in rel_item_paths:
-                # Find meta files that could provide meta info for this file.
-                for rel_meta_path in dis_ctx.meta_files_from_item(rel_item_path=rel_item_path):
-                    yield rel_meta_path
+    def cache_item_file(self, *, rel_item_path: pl.Path, force: bool=False):
+        self.cache_item_files(rel_item_paths=(rel_item_path,), force=force)
 
-        # TODO: Add dedupe here.
-        cls.cache_meta_files(rel_meta_paths=func(), force=force)
-
-    @classmethod
-    def cache_item_file(cls, *, rel_item_path: pl.Path, force: bool=False):
-        cls.cache_item_files(rel_item_paths=(rel_item_path,), force=force)
-
-    @classmethod
-    def clear_meta_files(cls, *, rel_meta_paths: typ.Iterable[pl.Path]):
-        mfc: MetaFileCache = cls.get_cache()
+    def clear_meta_files(self, *, rel_meta_paths: typ.Iterable[pl.Path]):
+        mfc: MetaFileCache = self.get_cache()
+        meta_file_presence = self.meta_file_presence
         for rel_meta_path in rel_meta_paths:
             mfc.pop(rel_meta_path, None)
+            meta_file_presence.pop(rel_meta_path, None)
 
-    @classmethod
-    def clear_meta_file(cls, *, rel_meta_path: pl.Path):
-        cls.clear_meta_files(rel_meta_paths=(rel_meta_path,))
+    def clear_meta_file(self, *, rel_meta_path: pl.Path):
+        self.clear_meta_files(rel_meta_paths=(rel_meta_path,))
 
-    @classmethod
-    def clear_item_files(cls, *, rel_item_paths: typ.Iterable[pl.Path]):
+    def clear_item_files(self, *, rel_item_paths: typ.Iterable[pl.Path]):
         # This process is intentionally coarse-grained, deleting an item file from cache
         # also deletes all sibling files from cache, as necessary.
-        dis_ctx: tcd.DiscoveryContext = cls.get_discovery_context()
+        dis_ctx: tcd.DiscoveryContext = self.get_discovery_context()
 
-        def func():
-            for rel_item_path in rel_item_paths:
-                # Find meta files that could provide meta info for this file.
-                for rel_meta_path in dis_ctx.meta_files_from_item(rel_item_path=rel_item_path):
-                    yield rel_meta_path
+        # Find meta files that could provide meta info for these files.
+        # All candidates are cleared, so that meta files that did not exist when last checked are looked for again.
+        rel_meta_paths = (rel_meta_path for rel_item_path in rel_item_paths
+                          for rel_meta_path, _ in dis_ctx.candidate_meta_files_from_item(rel_item_path=rel_item_path))
+        self.clear_meta_files(rel_meta_paths=rel_meta_paths)
 
-        cls.clear_meta_files(rel_meta_paths=func())
+    def clear_item_file(self, *, rel_item_path: pl.Path):
+        self.clear_item_files(rel_item_paths=(rel_item_path,))
 
-    @classmethod
-    def clear_item_file(cls, *, rel_item_path: pl.Path):
-        cls.clear_item_files(rel_item_paths=(rel_item_path,))
-
-    @classmethod
-    def clear_all(cls):
-        mfc: MetaFileCache = cls.get_cache()
+    def clear_all(self):
+        mfc: MetaFileCache = self.get_cache()
         mfc.clear()
+        self.meta_file_presence.clear()
 
-    @classmethod
-    def get_meta_file(cls, *, rel_meta_path: pl.Path) -> MetadataCache:
-        mfc: MetaFileCache = cls.get_cache()
+    def get_meta_file(self, *, rel_meta_path: pl.Path) -> MetadataCache:
+        mfc: MetaFileCache = self.get_cache()
         return mfc[rel_meta_path]
 
-    @classmethod
-    def get_item_file(cls, *, rel_item_path: pl.Path) -> tt.Metadata:
-        dis_ctx: tcd.DiscoveryContext = cls.get_discovery_context()
-
+    def get_item_file(self, *, rel_item_path: pl.Path) -> tt.Metadata:
         mc: MetadataCache = {}
-        for rel_meta_path in dis_ctx.meta_files_from_item(rel_item_path=rel_item_path):
-            if cls.contains_meta_file(rel_meta_path=rel_meta_path):
-                mc: MetadataCache = cls.get_meta_file(rel_meta_path=rel_meta_path)
+        for rel_meta_path in self.meta_files_from_item(rel_item_path=rel_item_path):
+            if self.contains_meta_file(rel_meta_path=rel_meta_path):
+                mc: MetadataCache = self.get_meta_file(rel_meta_path=rel_meta_path)
 
                 if rel_item_path in mc:
                     return mc[rel_item_path]
@@ -118,18 +209,14 @@ class MetaCacher(abc.ABC):
         # Doing this so we can return a KeyError.
         return mc[rel_item_path]
 
-    @classmethod
-    def contains_meta_file(cls, *, rel_meta_path: pl.Path) -> bool:
-        mfc: MetaFileCache = cls.get_cache()
+    def contains_meta_file(self, *, rel_meta_path: pl.Path) -> bool:
+        mfc: MetaFileCache = self.get_cache()
         return rel_meta_path in mfc
 
-    @classmethod
-    def contains_item_file(cls, *, rel_item_path: pl.Path) -> bool:
-        dis_ctx: tcd.DiscoveryContext = cls.get_discovery_context()
-
-        for rel_meta_path in dis_ctx.meta_files_from_item(rel_item_path=rel_item_path):
-            if cls.contains_meta_file(rel_meta_path=rel_meta_path):
-                mc = cls.get_meta_file(rel_meta_path=rel_meta_path)
+    def contains_item_file(self, *, rel_item_path: pl.Path) -> bool:
+        for rel_meta_path in self.meta_files_from_item(rel_item_path=rel_item_path):
+            if self.contains_meta_file(rel_meta_path=rel_meta_path):
+                mc = self.get_meta_file(rel_meta_path=rel_meta_path)
 
                 if rel_item_path in mc:
                     return True
@@ -137,16 +224,5 @@ class MetaCacher(abc.ABC):
         return False
 
 
-def gen_meta_cacher(*, discovery_context: tcd.DiscoveryContext) -> MetaCacher:
-    meta_file_cache: MetaFileCache = {}
-
-    class MC(MetaCacher):
-        @classmethod
-        def get_discovery_context(cls) -> tcd.DiscoveryContext:
-            return discovery_context
-
-        @classmethod
-        def get_cache(cls) -> MetaFileCache:
-            return meta_file_cache
-
-    return MC()
+def gen_meta_cacher(*, discovery_context: tcd.DiscoveryContext, use_process_pool: bool=False) -> MetaCacher:
+    return MetaCacher(discovery_context=discovery_context, use_process_pool=use_process_pool)
@@ -0,0 +1,131 @@
+"""On-disk persistence of parsed meta files, so that they can be reused across separate runs."""
+
+import typing as typ
+import pathlib as pl
+import atexit
+import os
+import os.path
+import hashlib
+import pickle
+
+import taggu.logging as tl
+
+logger = tl.get_logger(__name__)
+
+# Maps absolute meta file paths to their modification time in nanoseconds, their size in bytes, and their parsed
+# contents. The size guards against changes made within the resolution of the modification time.
+PersistedMetaFiles = typ.MutableMapping[str, typ.Tuple[int, int, typ.Any]]
+
+DEFAULT_CACHE_DIR = pl.Path(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))) / 'taggu'
+
+# Persisted meta files that are open in this process, keyed on their cache file path, along with the number of users
+# that have them open. Users of the same cache file share one mapping, so that their entries are merged into one save.
+OpenCache = typ.List[typ.Any]
+OPEN_CACHES: typ.MutableMapping[pl.Path, OpenCache] = {}
+
+
+def get_cache_file_path(root_dir: pl.Path, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> pl.Path:
+    """Returns the path of the file used to persist parsed meta files for a given library root directory."""
+    digest = hashlib.sha1(str(root_dir).encode('utf-8')).hexdigest()
+    return cache_dir / f'{digest}.pkl'
+
+
+def load_cache(root_dir: pl.Path, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> PersistedMetaFiles:
+    """Loads the persisted meta files for a library root directory. Returns an empty mapping if none could be read."""
+    cache_file_path = get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir)
+
+    try:
+        with cache_file_path.open(mode='rb') as f:
+            persisted = pickle.load(f)
+    except FileNotFoundError:
+        logger.debug(f'No persisted cache file found at "{cache_file_path}"')
+        return {}
+    except Exception as e:
+        # Unpickling damaged data can raise many kinds of errors, none of which should stop the library from working.
+        logger.warning(f'Unable to read persisted cache file "{cache_file_path}", ignoring: {e}')
+        return {}
+
+    if not isinstance(persisted, dict) or not all(isinstance(key, str) and isinstance(entry, tuple) and len(entry) == 3
+                                                  for key, entry in persisted.items()):
+        logger.warning(f'Persisted cache file "{cache_file_path}" has unexpected contents, ignoring')
+        return {}
+
+    logger.debug(f'Loaded persisted cache file "{cache_file_path}"')
+    return persisted
+
+
+def save_cache(root_dir: pl.Path, persisted: PersistedMetaFiles, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> None:
+    """Saves the persisted meta files for a library root directory."""
+    save_cache_file(cache_file_path=get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir), persisted=persisted)
+
+
+def save_cache_file(cache_file_path: pl.Path, persisted: PersistedMetaFiles) -> None:
+    temp_file_path = cache_file_path.with_name(f'{cache_file_path.name}.{os.getpid()}.tmp')
+
+    try:
+        cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first and then swap it in, so that readers never see a partial file.
+        with temp_file_path.open(mode='wb') as f:
+            pickle.dump(dict(persisted), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file_path, cache_file_path)
+    except OSError as e:
+        logger.warning(f'Unable to write persisted cache file "{cache_file_path}": {e}')
+        return
+
+    logger.debug(f'Saved persisted cache file "{cache_file_path}"')
+
+
+def prune_cache(persisted: PersistedMetaFiles) -> None:
+    """Removes the entries for meta files that no longer exist."""
+    for key in tuple(persisted):
+        if not os.path.exists(key):
+            logger.debug(f'Meta file "{key}" no longer exists, dropping its persisted entry')
+            persisted.pop(key, None)
+
+
+def open_cache(root_dir: pl.Path, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> PersistedMetaFiles:
+    """Returns the persisted meta files for a library root directory, loading them if not already open in this process.
+    Every call should be matched with a call to close_cache. Caches that are still open are saved on interpreter exit.
+    """
+    cache_file_path = get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir)
+
+    open_cache_entry = OPEN_CACHES.get(cache_file_path)
+    if open_cache_entry is None:
+        open_cache_entry = OPEN_CACHES[cache_file_path] = [load_cache(root_dir=root_dir, cache_dir=cache_dir), 0]
+
+    open_cache_entry[1] += 1
+    return open_cache_entry[0]
+
+
+def save_open_cache(root_dir: pl.Path, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> None:
+    """Saves the open persisted meta files for a library root directory, dropping entries for deleted meta files."""
+    cache_file_path = get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir)
+
+    open_cache_entry = OPEN_CACHES.get(cache_file_path)
+    if open_cache_entry is not None:
+        prune_cache(open_cache_entry[0])
+        save_cache_file(cache_file_path=cache_file_path, persisted=open_cache_entry[0])
+
+
+def close_cache(root_dir: pl.Path, cache_dir: pl.Path=DEFAULT_CACHE_DIR) -> None:
+    """Saves the open persisted meta files for a library root directory, and releases them once no longer in use."""
+    cache_file_path = get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir)
+
+    open_cache_entry = OPEN_CACHES.get(cache_file_path)
+    if open_cache_entry is None:
+        return
+
+    save_open_cache(root_dir=root_dir, cache_dir=cache_dir)
+
+    open_cache_entry[1] -= 1
+    if open_cache_entry[1] <= 0:
+        del OPEN_CACHES[cache_file_path]
+
+
+@atexit.register
+def save_open_caches() -> None:
+    """Saves all persisted meta files that are still open. Called once on interpreter exit."""
+    for cache_file_path, (persisted, _) in tuple(OPEN_CACHES.items()):
+        prune_cache(persisted)
+        save_cache_file(cache_file_path=cache_file_path, persisted=persisted)
@@ -10,7 +10,7 @@ MetadataValue = typ.Union[FieldValue, typ.Sequence['MetadataValue'], typ.Mapping
 
 Metadata = typ.Mapping[MetadataKey, MetadataValue]
 
-DirGetter = typ.Callable[[pl.Path], 'PathGen']
+DirGetter = typ.Callable[[pl.Path, pl.Path], 'PathPairGen']
 Multiplexer = typ.Callable[[typ.Any, pl.Path], 'PathMetadataPairGen']
 
 # MetaSourceSpec = typ.Tuple[pl.Path, DirGetter, Multiplexer]
@@ -28,5 +28,8 @@ MetadataResolver = typ.Callable[[pl.Path, str], typ.Generator[str, None, None]]
 
 PathGen = typ.Generator[pl.Path, None, None]
 
+PathPair = typ.Tuple[pl.Path, pl.Path]
+PathPairGen = typ.Generator[PathPair, None, None]
+
 PathMetadataPair = typ.Tuple[pl.Path, Metadata]
 PathMetadataPairGen = typ.Generator[PathMetadataPair, None, None]
@@ -1,3 +1,6 @@
+import sys
+
+import yaml.nodes
 import yaml.reader
 import yaml.scanner
 import yaml.parser
@@ -6,9 +9,31 @@ import yaml.constructor
 
 import taggu.yaml.resolver as tyr
 
+try:
+    from yaml.cyaml import CParser
+except ImportError:
+    # PyYAML was installed without libyaml bindings.
+    CParser = None
+
+
+class TagguConstructor(yaml.constructor.Constructor):
+    """A PyYAML constructor that interns the string keys of mappings. Mapping keys are nearly always field names, which
+    recur across many meta files, so interning lets them share memory and compare by identity on lookup.
+    """
+
+    def construct_mapping(self, node, deep=False):
+        if isinstance(node, yaml.nodes.MappingNode):
+            # Merge keys are resolved first, so that the key nodes they bring in are interned as well.
+            self.flatten_mapping(node)
+            for key_node, _ in node.value:
+                if isinstance(key_node, yaml.nodes.ScalarNode):
+                    key_node.value = sys.intern(key_node.value)
+
+        return super().construct_mapping(node, deep=deep)
+
 
 class TagguLoader(yaml.reader.Reader, yaml.scanner.Scanner, yaml.parser.Parser, yaml.composer.Composer,
-                  yaml.constructor.Constructor, tyr.TagguResolver):
+                  TagguConstructor, tyr.TagguResolver):
     """A custom PyYAML loader that only generates strings and nulls as scalars."""
 
     def __init__(self, stream):
@@ -16,5 +41,32 @@ class TagguLoader(yaml.reader.Reader, yaml.scanner.Scanner, yaml.parser.Parser,
         yaml.scanner.Scanner.__init__(self)
         yaml.parser.Parser.__init__(self)
         yaml.composer.Composer.__init__(self)
-        yaml.constructor.Constructor.__init__(self)
+        TagguConstructor.__init__(self)
         tyr.TagguResolver.__init__(self)
+
+
+if CParser is not None:
+    class TagguCLoader(CParser, TagguConstructor, tyr.TagguResolver):
+        """Same as TagguLoader, but with reading, scanning, parsing, and composing done by libyaml."""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            TagguConstructor.__init__(self)
+            tyr.TagguResolver.__init__(self)
+
+    class TagguCStreamLoader(CParser, yaml.composer.Composer, TagguConstructor, tyr.TagguResolver):
+        """Same as TagguCLoader, but with composing done in Python, so that individual nodes can be composed."""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            yaml.composer.Composer.__init__(self)
+            TagguConstructor.__init__(self)
+            tyr.TagguResolver.__init__(self)
+
+    FastestTagguLoader = TagguCLoader
+    FastestTagguStreamLoader = TagguCStreamLoader
+else:
+    TagguCLoader = None
+    TagguCStreamLoader = None
+    FastestTagguLoader = TagguLoader
+    FastestTagguStreamLoader = TagguLoader
@@ -1,8 +1,11 @@
 import logging
+import os
 import pathlib as pl
 import tempfile
 import unittest
 
+import yaml
+
 import taggu.contexts.discovery as tcd
 import taggu.contexts.library as tcl
 import taggu.helpers as th
@@ -43,6 +46,24 @@ class TestDiscovery(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=helper)
 
+    def test_candidate_meta_files_from_item(self):
+        lib_ctx = self.lib_ctx
+        dis_ctx = tcd.gen_discovery_ctx(library_context=lib_ctx)
+        root_dir = lib_ctx.get_root_dir()
+
+        def helper(curr_rel_path: pl.Path, curr_abs_path: pl.Path):
+            expected = [(curr_rel_path / tsth.SELF_META_FN, curr_abs_path / tsth.SELF_META_FN)]
+            if curr_rel_path != curr_rel_path.parent:
+                expected.append((curr_rel_path.parent / tsth.ITEM_META_FN, curr_abs_path.parent / tsth.ITEM_META_FN))
+
+            produced = dis_ctx.candidate_meta_files_from_item(rel_item_path=curr_rel_path)
+            self.assertEqual(tuple(expected), produced)
+
+            # Results are reused for the same item path.
+            self.assertIs(produced, dis_ctx.candidate_meta_files_from_item(rel_item_path=curr_rel_path))
+
+        tsth.traverse(root_dir=root_dir, func=helper)
+
     def test_items_from_meta_file(self):
         lib_ctx = self.lib_ctx
         dis_ctx = tcd.gen_discovery_ctx(library_context=lib_ctx)
@@ -84,6 +105,41 @@ class TestDiscovery(unittest.TestCase):
             produced = sorted(dis_ctx.items_from_meta_file(rel_meta_path=meta_rel_path), key=lambda x: x[0])
             self.assertEqual(expected, produced)
 
+    def test_read_meta_file_persisted(self):
+        dis_ctx = tcd.gen_discovery_ctx(library_context=self.lib_ctx)
+        dis_ctx.persisted = {}
+
+        abs_meta_path = self.root_dir_pl / tsth.SELF_META_FN
+        abs_meta_path.write_text('key: value\n')
+        st = os.stat(abs_meta_path)
+
+        expected = {'key': 'value'}
+        self.assertEqual(expected, dis_ctx.read_meta_file(abs_meta_path))
+        self.assertEqual((st.st_mtime_ns, st.st_size, expected), dis_ctx.persisted[str(abs_meta_path)])
+
+        # Changes that keep the modification time but change the size are still picked up.
+        abs_meta_path.write_text('key: longer value\n')
+        os.utime(abs_meta_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        expected = {'key': 'longer value'}
+        self.assertEqual(expected, dis_ctx.read_meta_file(abs_meta_path))
+
+        # Entries persisted in an older format are not used.
+        dis_ctx.persisted[str(abs_meta_path)] = (os.stat(abs_meta_path).st_mtime_ns, {'key': 'stale'})
+        self.assertEqual(expected, dis_ctx.read_meta_file(abs_meta_path))
+
+    def test_items_from_meta_file_broken(self):
+        dis_ctx = tcd.gen_discovery_ctx(library_context=self.lib_ctx)
+
+        # Broken meta files raise, whether or not their top level is a sequence, and for both kinds of meta file.
+        for meta_file_name in (tsth.SELF_META_FN, tsth.ITEM_META_FN):
+            abs_meta_path = self.root_dir_pl / meta_file_name
+            rel_meta_path = pl.Path(meta_file_name)
+            for contents in ('- x: 1\n---\n- y: 2\n', '- x: 1\n- [unclosed\n'):
+                abs_meta_path.write_text(contents)
+                with self.assertRaises(yaml.YAMLError):
+                    tuple(dis_ctx.items_from_meta_file(rel_meta_path=rel_meta_path))
+
     def tearDown(self):
         self.root_dir_obj.cleanup()
 
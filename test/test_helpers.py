@@ -1,5 +1,11 @@
+import collections.abc
+import pathlib as pl
+import tempfile
 import unittest
 
+import yaml
+
+import taggu.exceptions as tex
 import taggu.helpers as th
 
 
@@ -35,6 +41,98 @@ class TestHelpers(unittest.TestCase):
         s = th.pluralize(n=-2, single='entry', plural='entries')
         self.assertEqual(s, '-2 entries')
 
+    def test_is_valid_item_name(self):
+        for item_file_name in ('item', 'item.flac', '.item', '...', 'item name'):
+            self.assertTrue(th.is_valid_item_name(item_file_name))
+
+        for item_file_name in ('', '.', '..', 'dir/item', '/item', 'item/', '//'):
+            self.assertFalse(th.is_valid_item_name(item_file_name))
+
+    def test_read_yaml_file_streaming(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            abs_yaml_file_path = pl.Path(root_dir) / 'test.yml'
+
+            # Top level sequences are yielded one item at a time, and match a full load.
+            abs_yaml_file_path.write_text('- a: 1\n- &b [x, ~]\n- *b\n- \n')
+            produced = th.read_yaml_file_streaming(abs_yaml_file_path)
+            self.assertIsInstance(produced, collections.abc.Iterator)
+            self.assertEqual(th.read_yaml_file(abs_yaml_file_path), list(produced))
+
+            # The file is read up front, so later changes to it do not affect items that are not yielded yet.
+            expected = th.read_yaml_file(abs_yaml_file_path)
+            produced = th.read_yaml_file_streaming(abs_yaml_file_path)
+            abs_yaml_file_path.write_text('- changed\n')
+            self.assertEqual(expected, list(produced))
+
+            # Anything else is loaded as a whole.
+            for contents in ('a: [1, 2]\n', 'test\n', '~\n', ''):
+                abs_yaml_file_path.write_text(contents)
+                expected = th.read_yaml_file(abs_yaml_file_path)
+                produced = th.read_yaml_file_streaming(abs_yaml_file_path)
+                self.assertEqual(expected, produced)
+
+            # Multiple documents raise once the first sequence is exhausted, same as a full load.
+            abs_yaml_file_path.write_text('- x: 1\n---\n- y: 2\n')
+            with self.assertRaises(yaml.composer.ComposerError):
+                th.read_yaml_file(abs_yaml_file_path)
+            with self.assertRaises(yaml.composer.ComposerError):
+                list(th.read_yaml_file_streaming(abs_yaml_file_path))
+
+            # Syntax errors in a sequence raise once reached, same as a full load.
+            abs_yaml_file_path.write_text('- x: 1\n- [unclosed\n')
+            with self.assertRaises(yaml.YAMLError):
+                th.read_yaml_file(abs_yaml_file_path)
+            with self.assertRaises(yaml.YAMLError):
+                list(th.read_yaml_file_streaming(abs_yaml_file_path))
+
+    def test_item_discovery(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            abs_dir_path = pl.Path(root_dir)
+            (abs_dir_path / 'a.flac').touch()
+            (abs_dir_path / 'b.txt').touch()
+            (abs_dir_path / 'c.flac').mkdir()
+            (abs_dir_path / 'd').mkdir()
+
+            expected = frozenset(('a.flac', 'b.txt', 'c.flac', 'd'))
+            produced = th.item_discovery(abs_dir_path=abs_dir_path)
+            self.assertEqual(expected, produced)
+
+            expected = frozenset(('a.flac', 'c.flac', 'd'))
+            produced = th.item_discovery(abs_dir_path=abs_dir_path, item_filter=th.gen_suffix_item_filter('.flac'))
+            self.assertEqual(expected, produced)
+
+            expected = frozenset()
+            produced = th.item_discovery(abs_dir_path=abs_dir_path / 'a.flac')
+            self.assertEqual(expected, produced)
+
+    def test_fuzzy_file_lookup(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            abs_dir_path = pl.Path(root_dir)
+            for name in ('01. Intro.flac', '02. Song.flac', '02. Song (Live).flac', '[1] Bonus.flac'):
+                (abs_dir_path / name).touch()
+
+            expected = abs_dir_path / '01. Intro.flac'
+            produced = th.fuzzy_file_lookup(abs_dir_path=abs_dir_path, prefix_file_name='01')
+            self.assertEqual(expected, produced)
+
+            # Prefixes are matched literally, not as glob patterns.
+            expected = abs_dir_path / '[1] Bonus.flac'
+            produced = th.fuzzy_file_lookup(abs_dir_path=abs_dir_path, prefix_file_name='[1]')
+            self.assertEqual(expected, produced)
+
+            for prefix_file_name in ('02', '03', '[0-9]'):
+                with self.assertRaises(tex.NonUniqueFuzzyFileLookup):
+                    th.fuzzy_file_lookup(abs_dir_path=abs_dir_path, prefix_file_name=prefix_file_name)
+
+            with self.assertRaises(tex.NonUniqueFuzzyFileLookup):
+                th.fuzzy_file_lookup(abs_dir_path=abs_dir_path / 'DOES_NOT_EXIST', prefix_file_name='01')
+
+    def test_recursive_flatten(self):
+        expected = ('a', 1, None, 'b', 'c', 2.0, 'd', b'e', 'f', 'g')
+        produced = tuple(th.recursive_flatten(['a', [1, None, ('b', ['c'])], [], 2.0, collections.deque(['d']),
+                                               b'e', iter(['f']), 'g']))
+        self.assertEqual(expected, produced)
+
 
 if __name__ == '__main__':
     unittest.main()
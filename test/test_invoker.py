@@ -59,6 +59,24 @@ class TestInvoker(unittest.TestCase):
             more_ok = False
             self.assertFalse(ti.validate_types(args=args, types=types, more_ok=more_ok))
 
+    def test_vt_deco_gen(self):
+        # Decorated functions accept exactly the arguments that validate_types accepts.
+        all_args = ((), (1,), (1, 'test'), (1, 'test', 1.5), (1, 'test', 1.5, 'extra arg'), ('test', 1), (1, None))
+        all_types = ((int, str), [int, (str, type(None))], (int, str, float), it.repeat((int, str)))
+
+        for types, more_ok in it.product(all_types, (True, False)):
+            if types is all_types[-1] and not more_ok:
+                # Checking for extra types never finishes for an infinite iterable.
+                continue
+
+            func = ti.vt_deco_gen(types=types, more_ok=more_ok)(lambda *args: args)
+            for args in all_args:
+                if ti.validate_types(args=args, types=types, more_ok=more_ok):
+                    self.assertEqual(args, func(*args))
+                else:
+                    with self.assertRaises(ti.InvalidArgTypeException):
+                        func(*args)
+
     def test_normalize_arg_sequence_a(self):
         args = (1, 2, 3)
         desired_len = 6
@@ -65,6 +65,17 @@ class TestLibrary(unittest.TestCase):
         produced = lib_ctx.co_norm(rel_sub_path=rel_sub_path)
         self.assertEqual(expected, produced)
 
+        # Parent references that stay within the root dir are normalized away.
+        rel_sub_path = pl.Path('TEST', os.path.pardir, 'OTHER')
+        expected = (pl.Path('OTHER'), root_dir / 'OTHER')
+        produced = lib_ctx.co_norm(rel_sub_path=rel_sub_path)
+        self.assertEqual(expected, produced)
+
+        # Sibling dirs of the root dir whose names start with the name of the root dir are not sub paths.
+        rel_sub_path = pl.Path(os.path.pardir, root_dir.name + 'SUFFIX')
+        with self.assertRaises(tex.EscapingSubpath), self.assertLogs(logger=tl.__name__, level=logging.ERROR):
+            lib_ctx.co_norm(rel_sub_path=rel_sub_path)
+
         # Exception is raised if a path escapes the root dir.
         rel_sub_path = pl.Path(os.path.pardir)
         with self.assertRaises(tex.EscapingSubpath), self.assertLogs(logger=tl.__name__, level=logging.ERROR) as ctx:
@@ -93,14 +104,14 @@ class TestLibrary(unittest.TestCase):
         def func(rel_sub_path: pl.Path, abs_sub_path: pl.Path):
             if abs_sub_path.is_dir():
                 # A relative path to a directory yields the directory.
-                expected = (rel_sub_path,)
-                produced = tuple(lib_ctx.yield_contains_dir(rel_sub_path=rel_sub_path))
+                expected = ((rel_sub_path, abs_sub_path),)
+                produced = tuple(lib_ctx.yield_contains_dir(rel_sub_path=rel_sub_path, abs_sub_path=abs_sub_path))
                 self.assertEqual(expected, produced)
 
             else:
                 # A relative path to anything else yields nothing.
                 expected = ()
-                produced = tuple(lib_ctx.yield_contains_dir(rel_sub_path=rel_sub_path))
+                produced = tuple(lib_ctx.yield_contains_dir(rel_sub_path=rel_sub_path, abs_sub_path=abs_sub_path))
                 self.assertEqual(expected, produced)
 
         tsth.traverse(root_dir=root_dir, func=func)
@@ -109,17 +120,17 @@ class TestLibrary(unittest.TestCase):
         root_dir = self.root_dir_pl
         lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
 
-        def func(rel_sub_path: pl.Path, _: pl.Path):
+        def func(rel_sub_path: pl.Path, abs_sub_path: pl.Path):
             if len(rel_sub_path.parts) == 0:
                 # An empty normalized relative path (i.e. at the root) yields nothing.
                 expected = ()
-                produced = tuple(lib_ctx.yield_siblings_dir(rel_sub_path=rel_sub_path))
+                produced = tuple(lib_ctx.yield_siblings_dir(rel_sub_path=rel_sub_path, abs_sub_path=abs_sub_path))
                 self.assertEqual(expected, produced)
 
             else:
                 # Any non-empty normalized relative path yields the parent of that path.
-                expected = (rel_sub_path.parent,)
-                produced = tuple(lib_ctx.yield_siblings_dir(rel_sub_path=rel_sub_path))
+                expected = ((rel_sub_path.parent, abs_sub_path.parent),)
+                produced = tuple(lib_ctx.yield_siblings_dir(rel_sub_path=rel_sub_path, abs_sub_path=abs_sub_path))
                 self.assertEqual(expected, produced)
 
         tsth.traverse(root_dir=root_dir, func=func)
@@ -162,6 +173,23 @@ class TestLibrary(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=func)
 
+    def test_lib_ctx_entry_names_in_dir(self):
+        root_dir = self.root_dir_pl
+        lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
+
+        def func(rel_sub_path: pl.Path, abs_sub_path: pl.Path):
+            if abs_sub_path.is_dir():
+                expected = frozenset(os.listdir(str(abs_sub_path)))
+            else:
+                expected = frozenset()
+
+            produced = lib_ctx.entry_names_in_dir(rel_sub_dir_path=rel_sub_path)
+            self.assertEqual(expected, frozenset(produced))
+            self.assertEqual(len(expected), len(produced))
+            self.assertEqual(tuple(sorted(produced)), tuple(produced))
+
+        tsth.traverse(root_dir=root_dir, func=func)
+
     def test_lib_ctx_item_names_in_dir(self):
         root_dir = self.root_dir_pl
         lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
@@ -184,6 +212,59 @@ class TestLibrary(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=func)
 
+    def test_lib_ctx_scan_item_names_in_dir(self):
+        root_dir = self.root_dir_pl
+        lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
+
+        def func(rel_sub_path: pl.Path, abs_sub_path: pl.Path):
+            item_names, sorted_item_names = lib_ctx.scan_item_names_in_dir(rel_sub_dir_path=rel_sub_path)
+
+            # Both results contain the same names, and the sequence is sorted.
+            self.assertEqual(item_names, frozenset(sorted_item_names))
+            self.assertEqual(len(item_names), len(sorted_item_names))
+            self.assertEqual(tuple(sorted(sorted_item_names)), sorted_item_names)
+
+            self.assertEqual(item_names, lib_ctx.item_names_in_dir(rel_sub_dir_path=rel_sub_path))
+            self.assertEqual(sorted_item_names, lib_ctx.sorted_item_names_in_dir(rel_sub_dir_path=rel_sub_path))
+
+            # Item paths are in the same order as the sorted names, and are reused while the directory is unchanged.
+            sorted_item_paths = lib_ctx.sorted_item_paths_in_dir(rel_sub_dir_path=rel_sub_path)
+            self.assertEqual(tuple(rel_sub_path / n for n in sorted_item_names), sorted_item_paths)
+            self.assertIs(sorted_item_paths, lib_ctx.sorted_item_paths_in_dir(rel_sub_dir_path=rel_sub_path))
+
+            # Directory items are exactly those item paths that are directories on disk.
+            dir_item_paths = lib_ctx.dir_item_paths_in_dir(rel_sub_dir_path=rel_sub_path)
+            self.assertEqual({p for p in sorted_item_paths if (root_dir / p).is_dir()}, dir_item_paths)
+
+            if abs_sub_path.is_dir():
+                # Scan results reflect changes to the directory contents.
+                new_item_name = f'NEW{tsth.ITEM_FILE_EXT}'
+                (abs_sub_path / new_item_name).touch()
+                item_names, _ = lib_ctx.scan_item_names_in_dir(rel_sub_dir_path=rel_sub_path)
+                self.assertIn(new_item_name, item_names)
+
+                (abs_sub_path / new_item_name).unlink()
+                item_names, _ = lib_ctx.scan_item_names_in_dir(rel_sub_dir_path=rel_sub_path)
+                self.assertNotIn(new_item_name, item_names)
+
+        tsth.traverse(root_dir=root_dir, func=func)
+
+        # Cached listings can be dropped, and are rebuilt on demand.
+        sorted_item_paths = lib_ctx.sorted_item_paths_in_dir(rel_sub_dir_path=pl.Path())
+        lib_ctx.clear_dir_caches()
+        self.assertEqual(0, lib_ctx.scan_dir_cached.cache_info().currsize)
+        self.assertEqual(0, lib_ctx.sorted_item_paths_in_dir_cached.cache_info().currsize)
+        self.assertEqual(0, lib_ctx.dir_item_paths_in_dir_cached.cache_info().currsize)
+        self.assertEqual(sorted_item_paths, lib_ctx.sorted_item_paths_in_dir(rel_sub_dir_path=pl.Path()))
+
+        # Changes are picked up even if they keep the modification time of the directory, as with coarse timestamps.
+        st = os.stat(root_dir)
+        new_dir_name = 'NEW_DIR'
+        (root_dir / new_dir_name).mkdir()
+        os.utime(root_dir, ns=(st.st_atime_ns, st.st_mtime_ns))
+        item_names, _ = lib_ctx.scan_item_names_in_dir(rel_sub_dir_path=pl.Path())
+        self.assertIn(new_dir_name, item_names)
+
     def test_lib_ctx_yield_self_meta_pairs(self):
         root_dir = self.root_dir_pl
         lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
@@ -367,6 +448,18 @@ class TestLibrary(unittest.TestCase):
         produced = tuple(lib_ctx.yield_meta_source_specs())
         self.assertEqual(expected, produced)
 
+    def test_lib_ctx_get_meta_source_spec(self):
+        root_dir = self.root_dir_pl
+        lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter)
+
+        for meta_spec in lib_ctx.yield_meta_source_specs():
+            expected = meta_spec
+            produced = lib_ctx.get_meta_source_spec(meta_file_name=str(meta_spec.meta_file_name))
+            self.assertEqual(expected, produced)
+
+        # Unknown meta file names have no meta source spec.
+        self.assertIsNone(lib_ctx.get_meta_source_spec(meta_file_name='DOES_NOT_EXIST'))
+
     def tearDown(self):
         # Uncomment this to inspect the created directory structure.
         # import ipdb; ipdb.set_trace()
@@ -2,6 +2,7 @@ import logging
 import pathlib as pl
 import tempfile
 import unittest
+import unittest.mock as mock
 import random
 
 import taggu.contexts.discovery as tcd
@@ -68,6 +69,29 @@ class TestQuery(unittest.TestCase):
         produced = meta_cacher.get_cache()
         self.assertEqual(expected, produced)
 
+    def test_meta_files_from_item(self):
+        dis_ctx: tcd.DiscoveryContext = self.dis_ctx
+        meta_cacher = self.new_meta_cacher()
+
+        for rel_item_path in self.rel_item_paths:
+            expected = tuple(dis_ctx.meta_files_from_item(rel_item_path))
+            produced = tuple(meta_cacher.meta_files_from_item(rel_item_path))
+            self.assertEqual(expected, produced)
+
+        # Presence of meta files is remembered until cleared.
+        rel_meta_path = min(p for p in self.rel_meta_paths if p.name == tsth.SELF_META_FN)
+        rel_item_path = rel_meta_path.parent
+        abs_meta_path = self.root_dir_pl / rel_meta_path
+        abs_meta_path.rename(abs_meta_path.with_name('TEMP'))
+        self.assertIn(rel_meta_path, tuple(meta_cacher.meta_files_from_item(rel_item_path)))
+
+        meta_cacher.clear_meta_file(rel_meta_path=rel_meta_path)
+        self.assertNotIn(rel_meta_path, tuple(meta_cacher.meta_files_from_item(rel_item_path)))
+
+        abs_meta_path.with_name('TEMP').rename(abs_meta_path)
+        meta_cacher.clear_all()
+        self.assertIn(rel_meta_path, tuple(meta_cacher.meta_files_from_item(rel_item_path)))
+
     def test_cache_meta_files(self):
         meta_cacher = self.new_meta_cacher()
 
@@ -84,6 +108,35 @@ class TestQuery(unittest.TestCase):
         mc = meta_cacher.get_cache()
         self.assertEqual(len(mc), 0)
 
+    def test_cache_meta_files_in_processes(self):
+        rel_meta_paths = self.rel_meta_paths
+
+        meta_cacher = self.new_meta_cacher()
+        meta_cacher.cache_meta_files(rel_meta_paths=rel_meta_paths)
+        expected = meta_cacher.get_cache()
+
+        # Lower the batch size at which meta files are parsed in worker processes, so that they are used here.
+        # The pool is patched, so that this test starts and shuts down its own pool, regardless of other tests.
+        with mock.patch.object(tmc, 'META_FILE_PARSER_POOL_MIN_FILES', 1), \
+                mock.patch.object(tmc, 'META_FILE_PARSER_POOL_WORKERS', max(2, tmc.META_FILE_PARSER_POOL_WORKERS)), \
+                mock.patch.object(tmc, 'META_FILE_PARSER_POOL', None):
+            try:
+                # Worker processes are only used when opted into.
+                meta_cacher = self.new_meta_cacher()
+                meta_cacher.cache_meta_files(rel_meta_paths=rel_meta_paths)
+                self.assertIsNone(tmc.META_FILE_PARSER_POOL)
+
+                meta_cacher = tmc.gen_meta_cacher(discovery_context=self.dis_ctx, use_process_pool=True)
+                missing_rel_meta_path = pl.Path('DOES_NOT_EXIST') / tsth.SELF_META_FN
+                meta_cacher.cache_meta_files(rel_meta_paths=rel_meta_paths | {missing_rel_meta_path})
+                produced = meta_cacher.get_cache()
+                self.assertIsNotNone(tmc.META_FILE_PARSER_POOL)
+            finally:
+                if tmc.META_FILE_PARSER_POOL is not None:
+                    tmc.META_FILE_PARSER_POOL.shutdown()
+
+        self.assertEqual(expected, produced)
+
     def test_cache_item_files(self):
         meta_cacher = self.new_meta_cacher()
 
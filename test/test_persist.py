@@ -0,0 +1,116 @@
+import logging
+import pathlib as pl
+import pickle
+import tempfile
+import unittest
+
+import taggu.persist as tp
+
+
+class TestPersist(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir_obj = tempfile.TemporaryDirectory()
+
+        self.cache_dir_pl = pl.Path(self.cache_dir_obj.name) / 'taggu'
+        self.root_dir_pl = pl.Path('/music/library')
+
+    def test_get_cache_file_path(self):
+        cache_dir = self.cache_dir_pl
+
+        # Same root directory produces the same path.
+        expected = tp.get_cache_file_path(root_dir=pl.Path('/a'), cache_dir=cache_dir)
+        produced = tp.get_cache_file_path(root_dir=pl.Path('/a'), cache_dir=cache_dir)
+        self.assertEqual(expected, produced)
+        self.assertEqual(cache_dir, produced.parent)
+
+        # Different root directories produce different paths.
+        self.assertNotEqual(tp.get_cache_file_path(root_dir=pl.Path('/a'), cache_dir=cache_dir),
+                            tp.get_cache_file_path(root_dir=pl.Path('/b'), cache_dir=cache_dir))
+
+    def test_load_cache(self):
+        cache_dir = self.cache_dir_pl
+        root_dir = self.root_dir_pl
+
+        # Nothing persisted yet.
+        expected = {}
+        produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+        self.assertEqual(expected, produced)
+
+        # A corrupted cache file is ignored.
+        cache_dir.mkdir(parents=True)
+        tp.get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir).write_bytes(b'not a pickle')
+        with self.assertLogs(logger=tp.__name__, level=logging.WARNING):
+            produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+        self.assertEqual(expected, produced)
+
+        # Garbage that fails to unpickle with other kinds of errors is ignored as well.
+        # These raise ValueError, UnicodeDecodeError and OverflowError respectively.
+        for garbage in (b'\x80\x63.', b'\x80\x04X\x02\x00\x00\x00\xff\xfe.',
+                        b'\x80\x04\x8e\xff\xff\xff\xff\xff\xff\xff\xff'):
+            tp.get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir).write_bytes(garbage)
+            with self.assertLogs(logger=tp.__name__, level=logging.WARNING):
+                produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertEqual(expected, produced)
+
+        # Well-formed pickles whose entries have an unexpected shape are ignored as well.
+        for persisted in ({'/a': 'not a tuple'}, {'/a': (1, 2)}, {1: (1, 2, 3)}):
+            tp.get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir).write_bytes(pickle.dumps(persisted))
+            with self.assertLogs(logger=tp.__name__, level=logging.WARNING):
+                produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertEqual(expected, produced)
+
+    def test_save_cache(self):
+        cache_dir = self.cache_dir_pl
+        root_dir = self.root_dir_pl
+
+        persisted = {
+            '/music/library/taggu_self.yml': (12345, 100, {'title': 'value', 'artist': ['a', None]}),
+            '/music/library/taggu_item.yml': (67890, 200, ['block', {'key': None}]),
+        }
+
+        tp.save_cache(root_dir=root_dir, persisted=persisted, cache_dir=cache_dir)
+
+        expected = persisted
+        produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+        self.assertEqual(expected, produced)
+
+        # Other root directories are not affected.
+        expected = {}
+        produced = tp.load_cache(root_dir=pl.Path('/other'), cache_dir=cache_dir)
+        self.assertEqual(expected, produced)
+
+    def test_open_cache(self):
+        cache_dir = self.cache_dir_pl
+
+        with tempfile.TemporaryDirectory() as root_dir_name:
+            root_dir = pl.Path(root_dir_name)
+            kept_key = str(root_dir / 'taggu_self.yml')
+            deleted_key = str(root_dir / 'taggu_item.yml')
+            (root_dir / 'taggu_self.yml').touch()
+
+            # Users of the same root directory share the same persisted meta files, so their entries are merged.
+            persisted_a = tp.open_cache(root_dir=root_dir, cache_dir=cache_dir)
+            persisted_b = tp.open_cache(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertIs(persisted_a, persisted_b)
+
+            persisted_a[kept_key] = (12345, 100, {'key': 'a'})
+            persisted_b[deleted_key] = (67890, 200, {'key': 'b'})
+
+            # Entries for meta files that no longer exist are dropped on save.
+            tp.close_cache(root_dir=root_dir, cache_dir=cache_dir)
+            expected = {kept_key: (12345, 100, {'key': 'a'})}
+            produced = tp.load_cache(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertEqual(expected, produced)
+
+            # The persisted meta files are released once every user has closed them.
+            cache_file_path = tp.get_cache_file_path(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertIn(cache_file_path, tp.OPEN_CACHES)
+            tp.close_cache(root_dir=root_dir, cache_dir=cache_dir)
+            self.assertNotIn(cache_file_path, tp.OPEN_CACHES)
+
+    def tearDown(self):
+        self.cache_dir_obj.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
+import collections
 import logging
+import os
 import pathlib as pl
 import tempfile
 import unittest
@@ -7,6 +9,7 @@ import itertools as it
 import taggu.contexts.discovery as td
 import taggu.contexts.library as tl
 import taggu.contexts.query as tq
+import taggu.exceptions as tex
 import taggu.helpers as th
 import test.helpers as tsth
 
@@ -173,6 +176,35 @@ class TestQuery(unittest.TestCase):
                                             mapping_iter_style=tq.MappingIterStyle.VALS))
         self.assertEqual(expected, produced)
 
+    def test_ancestor_paths(self):
+        for rel_item_path in (pl.Path('a/b/c'), pl.Path('a/b'), pl.Path('a'), pl.Path()):
+            expected = tuple(rel_item_path.parents)
+            produced = tq.ancestor_paths(rel_item_path)
+            self.assertEqual(expected, produced)
+
+        # Items in the same directory share their ancestor paths.
+        self.assertIs(tq.ancestor_paths(pl.Path('a/b/c')), tq.ancestor_paths(pl.Path('a/b/d')))
+
+    def test_normalize_labels(self):
+        self.assertIsNone(tq.normalize_labels(None))
+
+        labels = frozenset(('a', 'b'))
+        self.assertIs(labels, tq.normalize_labels(labels))
+        self.assertEqual(labels, tq.normalize_labels(['a', 'b', 'a']))
+        self.assertEqual(labels, tq.normalize_labels(('a', 'b')))
+
+        # A single string is not split into its characters.
+        with self.assertRaises(TypeError):
+            tq.normalize_labels('ab')
+
+    def test_canonical_field_type(self):
+        self.assertIs(str, tq.canonical_field_type(type('StrSubclass', (str,), {})('value')))
+        self.assertIs(list, tq.canonical_field_type(collections.UserList(['a', 'b'])))
+        self.assertIs(list, tq.canonical_field_type(range(3)))
+        self.assertIs(dict, tq.canonical_field_type(collections.OrderedDict(a=1)))
+        self.assertIs(dict, tq.canonical_field_type(collections.UserDict(a=1)))
+        self.assertIs(int, tq.canonical_field_type(27))
+
     def test_yield_field(self):
         root_dir = self.root_dir_pl
         qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx,
@@ -206,6 +238,19 @@ class TestQuery(unittest.TestCase):
                                                  mapping_iter_style=tq.MappingIterStyle.KEYS))
             self.assertEqual(expected, produced)
 
+            self.assertTrue(qry_ctx.item_meets_labels(rel_item_path=curr_rel_path, labels=None))
+            self.assertTrue(qry_ctx.item_meets_labels(rel_item_path=curr_rel_path, labels=matching_labels))
+            self.assertFalse(qry_ctx.item_meets_labels(rel_item_path=curr_rel_path, labels=distinct_labels))
+
+            # Skipping the label check yields the item metadata regardless of labels.
+            expected = (tsth.gen_item_meta_str_val(curr_rel_path),) if curr_rel_path.parts else ()
+            produced = tuple(qry_ctx.yield_field(rel_item_path=curr_rel_path,
+                                                 field_name=tsth.gen_item_meta_key(curr_rel_path),
+                                                 labels=distinct_labels,
+                                                 mapping_iter_style=tq.MappingIterStyle.KEYS,
+                                                 check_labels=False))
+            self.assertEqual(expected, produced)
+
             # Validate self metadata.
             expected = (tsth.gen_self_meta_str_val(curr_rel_path),) if curr_abs_path.is_dir() else ()
             produced = tuple(qry_ctx.yield_field(rel_item_path=curr_rel_path,
@@ -239,6 +284,142 @@ class TestQuery(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=func, action_filter=tsth.default_item_filter)
 
+    def test_item_meets_labels_cached(self):
+        extracted = collections.Counter()
+
+        def label_extractor(rel_item_path: pl.Path) -> str:
+            extracted[rel_item_path] += 1
+            return tsth.default_label_extractor(rel_item_path)
+
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=label_extractor, use_cache=False)
+        rel_item_path = pl.Path('ALBUM_01')
+
+        for labels in (('ALBUM',), ('DISC',), ('ALBUM',)):
+            expected = labels == ('ALBUM',)
+            produced = qry_ctx.item_meets_labels(rel_item_path=rel_item_path, labels=labels)
+            self.assertEqual(expected, produced)
+
+        # Labels are only extracted once per item.
+        self.assertEqual({rel_item_path: 1}, extracted)
+        self.assertIs(label_extractor, qry_ctx.get_label_extractor())
+
+    def test_yield_field_without_cache(self):
+        root_dir = self.root_dir_pl
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=False)
+
+        rel_item_path = pl.Path()
+        field_name = tsth.gen_self_meta_key(rel_item_path)
+
+        def yield_field():
+            return tuple(qry_ctx.yield_field(rel_item_path=rel_item_path, field_name=field_name, labels=None,
+                                             mapping_iter_style=tq.MappingIterStyle.KEYS))
+
+        # Repeated lookups produce the same results.
+        expected = (tsth.gen_self_meta_str_val(rel_item_path),)
+        self.assertEqual(expected, yield_field())
+        self.assertEqual(expected, yield_field())
+
+        # Modifying the meta file is picked up by the next lookup.
+        abs_meta_path = root_dir / tsth.SELF_META_FN
+        mtime_ns = os.stat(abs_meta_path).st_mtime_ns
+        abs_meta_path.write_text(f'{field_name}: modified\n')
+        os.utime(abs_meta_path, ns=(mtime_ns, mtime_ns + 1000000000))
+
+        expected = ('modified',)
+        self.assertEqual(expected, yield_field())
+
+    def test_yield_fields_batch(self):
+        root_dir = self.root_dir_pl
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=tsth.default_label_extractor,
+                                   use_cache=False)
+
+        rel_item_paths = sorted(tsth.yield_fs_contents_recursively(root_dir=root_dir,
+                                                                   pass_filter=tsth.default_item_filter))
+        labels = frozenset((tsth.default_label_extractor(root_dir / rel_item_paths[-1]),))
+
+        for field_name in (tsth.CNST_META_KEY, 'DOES_NOT_EXIST'):
+            expected = tuple((rel_item_path, field_val)
+                             for rel_item_path in rel_item_paths
+                             for field_val in qry_ctx.yield_field(rel_item_path=rel_item_path, field_name=field_name,
+                                                                  labels=labels,
+                                                                  mapping_iter_style=tq.MappingIterStyle.KEYS))
+            produced = tuple(qry_ctx.yield_fields_batch(rel_item_paths=rel_item_paths, field_name=field_name,
+                                                        labels=labels, mapping_iter_style=tq.MappingIterStyle.KEYS))
+            self.assertEqual(expected, produced)
+
+    def test_yield_field_empty_meta_file(self):
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
+
+        rel_item_path = pl.Path()
+        field_name = tsth.gen_self_meta_key(rel_item_path)
+
+        # Meta files that provide no metadata are not stored in the meta cacher, and are skipped.
+        (self.root_dir_pl / tsth.SELF_META_FN).write_text('')
+
+        expected = ()
+        produced = tuple(qry_ctx.yield_field(rel_item_path=rel_item_path, field_name=field_name, labels=None,
+                                             mapping_iter_style=tq.MappingIterStyle.KEYS))
+        self.assertEqual(expected, produced)
+
+    def test_yield_field_mapping(self):
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
+
+        rel_item_path = pl.Path()
+        (self.root_dir_pl / tsth.SELF_META_FN).write_text('mapping_field: {key_a: val_a, key_b: val_b}\n')
+
+        def yield_field(mapping_iter_style: tq.MappingIterStyle, recursive: bool):
+            return tuple(qry_ctx.yield_field(rel_item_path=rel_item_path, field_name='mapping_field', labels=None,
+                                             mapping_iter_style=mapping_iter_style, recursive=recursive))
+
+        self.assertEqual(3, len(tq.MappingIterStyle))
+
+        self.assertEqual(('key_a', 'key_b'), yield_field(tq.MappingIterStyle.KEYS, True))
+        self.assertEqual(('val_a', 'val_b'), yield_field(tq.MappingIterStyle.VALS, True))
+        self.assertEqual(('key_a', 'val_a', 'key_b', 'val_b'), yield_field(tq.MappingIterStyle.PAIRS, True))
+        self.assertEqual((('key_a', 'val_a'), ('key_b', 'val_b')), yield_field(tq.MappingIterStyle.PAIRS, False))
+
+    def test_preload_meta_files(self):
+        rel_meta_paths = frozenset(tsth.yield_fs_contents_recursively(root_dir=self.root_dir_pl,
+                                                                      pass_filter=tsth.is_meta_file_path))
+
+        # Without a meta cacher, preloaded meta files are stored in the query context.
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=False)
+        qry_ctx.preload_meta_files(rel_meta_paths)
+        self.assertEqual(rel_meta_paths, qry_ctx.meta_file_cache.keys())
+
+        for rel_meta_path in rel_meta_paths:
+            expected = dict(self.dis_ctx.items_from_meta_file(rel_meta_path=rel_meta_path))
+            produced = qry_ctx.load_meta_file(rel_meta_path=rel_meta_path)
+            self.assertEqual(expected, produced)
+
+        # With a meta cacher, preloaded meta files are stored in the meta cacher.
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
+        qry_ctx.preload_meta_files(rel_meta_paths)
+        self.assertEqual(rel_meta_paths, qry_ctx.get_meta_cacher().get_cache().keys())
+
+    def test_load_meta_file(self):
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=False)
+
+        rel_meta_path = pl.Path(tsth.SELF_META_FN)
+        abs_meta_path = self.root_dir_pl / rel_meta_path
+        abs_meta_path.write_text('key: value\n')
+        st = os.stat(abs_meta_path)
+
+        expected = {pl.Path('.'): {'key': 'value'}}
+        produced = qry_ctx.load_meta_file(rel_meta_path=rel_meta_path)
+        self.assertEqual(expected, produced)
+
+        # Loads of an unmodified meta file are reused.
+        self.assertIs(produced, qry_ctx.load_meta_file(rel_meta_path=rel_meta_path))
+
+        # Changes that keep the modification time but change the size are still picked up.
+        abs_meta_path.write_text('key: longer value\n')
+        os.utime(abs_meta_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        expected = {pl.Path('.'): {'key': 'longer value'}}
+        produced = qry_ctx.load_meta_file(rel_meta_path=rel_meta_path)
+        self.assertEqual(expected, produced)
+
     def test_yield_parent_fields(self):
         root_dir = self.root_dir_pl
         qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
@@ -304,6 +485,62 @@ class TestQuery(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=func, action_filter=tsth.default_item_filter)
 
+    def test_yield_parent_fields_labels(self):
+        root_dir = self.root_dir_pl
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=tsth.default_label_extractor,
+                                   use_cache=False)
+
+        def func(curr_rel_path: pl.Path, _: pl.Path):
+            for rel_parent in curr_rel_path.parents:
+                # Only ancestors with the same label as this parent are looked at.
+                labels = (tsth.default_label_extractor(rel_parent),)
+
+                expected = ()
+                for rel_ancestor in curr_rel_path.parents:
+                    expected = tuple(qry_ctx.yield_field(rel_item_path=rel_ancestor, field_name=tsth.CNST_META_KEY,
+                                                         labels=labels, mapping_iter_style=tq.MappingIterStyle.KEYS))
+                    if expected:
+                        break
+
+                produced = tuple(qry_ctx.yield_parent_fields(rel_item_path=curr_rel_path,
+                                                             field_name=tsth.CNST_META_KEY,
+                                                             labels=labels,
+                                                             mapping_iter_style=tq.MappingIterStyle.KEYS))
+                self.assertEqual(expected, produced)
+
+        tsth.traverse(root_dir=root_dir, func=func, action_filter=tsth.default_item_filter)
+
+    def test_yield_parent_fields_broken_far_ancestor(self):
+        with tempfile.TemporaryDirectory() as root_dir_name:
+            root_dir = pl.Path(root_dir_name)
+            lib_ctx = tl.gen_library_ctx(root_dir=root_dir, media_item_filter=tsth.default_item_filter,
+                                         self_meta_file_name=tsth.SELF_META_FN, item_meta_file_name=tsth.ITEM_META_FN)
+            dis_ctx = td.gen_discovery_ctx(library_context=lib_ctx)
+
+            (root_dir / 'A' / 'B').mkdir(parents=True)
+            (root_dir / 'A' / 'B' / f'track{tsth.ITEM_FILE_EXT}').touch()
+            (root_dir / 'A' / 'B' / tsth.SELF_META_FN).write_text('artist: near\n')
+
+            # This meta file names an item that does not exist, so loading it fails.
+            (root_dir / tsth.ITEM_META_FN).write_text('NOPE: {artist: far}\n')
+
+            rel_item_path = pl.Path('A') / 'B' / f'track{tsth.ITEM_FILE_EXT}'
+
+            # Far ancestors are never reached when the nearest ancestor has the field, so their errors do not matter.
+            for use_cache in (False, True):
+                qry_ctx = tq.gen_query_ctx(discovery_context=dis_ctx, label_extractor=None, use_cache=use_cache)
+                produced = tuple(qry_ctx.yield_parent_fields(rel_item_path=rel_item_path, field_name='artist',
+                                                             labels=None, mapping_iter_style=tq.MappingIterStyle.KEYS))
+                self.assertEqual(('near',), produced)
+
+            # Once reached, the broken meta file still raises.
+            (root_dir / 'A' / 'B' / tsth.SELF_META_FN).write_text('title: near\n')
+            for use_cache in (False, True):
+                qry_ctx = tq.gen_query_ctx(discovery_context=dis_ctx, label_extractor=None, use_cache=use_cache)
+                with self.assertRaises(tex.NonUniqueFuzzyFileLookup):
+                    tuple(qry_ctx.yield_parent_fields(rel_item_path=rel_item_path, field_name='artist',
+                                                      labels=None, mapping_iter_style=tq.MappingIterStyle.KEYS))
+
     def test_yield_child_fields(self):
         root_dir = self.root_dir_pl
         qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
@@ -393,6 +630,28 @@ class TestQuery(unittest.TestCase):
 
         tsth.traverse(root_dir=root_dir, func=func, action_filter=tsth.default_item_filter)
 
+    def test_yield_child_fields_cyclic(self):
+        root_dir = self.root_dir_pl
+        qry_ctx = tq.gen_query_ctx(discovery_context=self.dis_ctx, label_extractor=None, use_cache=True)
+
+        rel_item_paths = frozenset(tsth.yield_fs_contents_recursively(root_dir=root_dir,
+                                                                      pass_filter=tsth.default_item_filter))
+
+        # Create a directory that contains itself.
+        (root_dir / 'LOOP').symlink_to(root_dir, target_is_directory=True)
+
+        # Fields are only found once, and are not found again through the cycle.
+        for rel_item_path in rel_item_paths:
+            if not rel_item_path.parts:
+                continue
+
+            expected = (tsth.gen_item_meta_str_val(rel_item_path),)
+            produced = tuple(qry_ctx.yield_child_fields(rel_item_path=pl.Path(),
+                                                        field_name=tsth.gen_item_meta_key(rel_item_path),
+                                                        labels=None,
+                                                        mapping_iter_style=tq.MappingIterStyle.KEYS))
+            self.assertEqual(expected, produced)
+
     def tearDown(self):
         # import ipdb; ipdb.set_trace()
         # input('Press ENTER to continue and cleanup')
@@ -72,11 +72,32 @@ class TestYamlLoader(unittest.TestCase):
 
             # TODO: Add tests for mappings.
 
-        for yaml_str, expected in yield_eps():
-            yaml_str_io = io.StringIO(yaml_str)
-            produced = yaml.load(yaml_str_io, Loader=tyl.TagguLoader)
+        loaders = [tyl.TagguLoader]
+        if tyl.TagguCLoader is not None:
+            loaders.append(tyl.TagguCLoader)
 
-            self.assertEqual(expected, produced)
+        for loader in loaders:
+            for yaml_str, expected in yield_eps():
+                yaml_str_io = io.StringIO(yaml_str)
+                produced = yaml.load(yaml_str_io, Loader=loader)
+
+                self.assertEqual(expected, produced)
+
+    def test_yaml_loader_interns_keys(self):
+        yaml_str = 'base: &base {key_a: a}\nitem:\n  <<: *base\n  key_b: b\n  key_c: [c]\n'
+
+        loaders = [tyl.TagguLoader]
+        if tyl.TagguCLoader is not None:
+            loaders.append(tyl.TagguCLoader)
+
+        for loader in loaders:
+            produced_a = yaml.load(io.StringIO(yaml_str), Loader=loader)['item']
+            produced_b = yaml.load(io.StringIO(yaml_str), Loader=loader)['item']
+            self.assertEqual({'key_a': 'a', 'key_b': 'b', 'key_c': ['c']}, produced_a)
+
+            # Equal keys from separate loads are the same object.
+            for key_a, key_b in zip(produced_a, produced_b):
+                self.assertIs(key_a, key_b)
 
     def tearDown(self):
         pass